@@ -0,0 +1,397 @@
+import argparse
+import builtins
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+# Benchmarks for git-123: builds a synthetic workspace (local bare remotes,
+# thousands of prefixed branches, deep histories, big database/<schema>
+# trees), then drives the menu and git helper code paths with scripted input
+# and records latency and the number of subprocesses of each scenario.
+#
+#   python git-123-bench.py --save baseline.json
+#   python git-123-bench.py --compare baseline.json
+
+
+class CountingPopen(subprocess.Popen):
+    count = 0
+    lock = threading.Lock()
+
+    def __init__(self, *args, **kwargs):
+        with CountingPopen.lock:
+            CountingPopen.count += 1
+        super().__init__(*args, **kwargs)
+
+
+class ScriptedInput:
+    # Answers the prompts of one scenario run, in order.
+    def __init__(self):
+        self.answers = []
+
+    def __call__(self, prompt=""):
+        if not self.answers:
+            raise RuntimeError(f"Unexpected prompt: {prompt!r}")
+        return self.answers.pop(0)
+
+
+def Git(args, cwd=None, input=None):
+    proc = subprocess.run(["git"] + args, cwd=cwd, input=input, capture_output=True)
+    if proc.returncode != 0:
+        error = proc.stderr.decode(errors="replace")
+        raise RuntimeError(f"git {' '.join(args[:3])} failed: {error}")
+    return proc.stdout.decode()
+
+
+def FastImportStream(settings):
+    # One commit adding the whole database tree, then a deep history touching
+    # a few files per commit, and the branches pointing along that history.
+    main = settings["mainBranch"]
+    chunks = []
+    mark = 0
+
+    def Blob(text):
+        nonlocal mark
+        mark += 1
+        data = text.encode()
+        chunks.append(b"blob\nmark :%d\ndata %d\n%s\n" % (mark, len(data), data))
+        return mark
+
+    def Commit(ref, message, files, parent=None):
+        nonlocal mark
+        marks = [(path, Blob(text)) for path, text in files]
+        mark += 1
+        msg = message.encode()
+        chunks.append(
+            b"commit %s\nmark :%d\ncommitter bench <bench@example.com> %d +0000\n"
+            b"data %d\n%s\n"
+            % (ref.encode(), mark, 1600000000 + mark, len(msg), msg)
+        )
+        if parent:
+            chunks.append(b"from :%d\n" % parent)
+        for path, blobMark in marks:
+            chunks.append(b"M 100644 :%d %s\n" % (blobMark, path.encode()))
+        chunks.append(b"\n")
+        return mark
+
+    paths = [
+        f"database/schema{s}/object{f}.sql"
+        for s in range(settings["schemas"])
+        for f in range(settings["files"])
+    ]
+    head = Commit(
+        f"refs/heads/{main}",
+        "Initial",
+        [(path, f"-- {path}\nselect 1 from dual;\n") for path in paths],
+    )
+    history = [head]
+    for n in range(1, settings["commits"]):
+        path = paths[(n * 7919) % len(paths)]
+        head = Commit(
+            f"refs/heads/{main}",
+            f"Change {n}",
+            [(path, f"-- {path}\nselect {n} from dual;\n")],
+            head,
+        )
+        history.append(head)
+    for n in range(settings["branches"]):
+        prefix = settings["prefixes"][n % len(settings["prefixes"])]
+        parent = history[(n * 31) % len(history)]
+        if n % 10 == 0:
+            # every tenth branch carries its own SQL change
+            path = paths[n % len(paths)]
+            Commit(
+                f"refs/heads/{prefix}/{n}",
+                f"Task {n}",
+                [(path, f"-- {path}\nselect -{n} from dual;\n")],
+                parent,
+            )
+        else:
+            ref = f"refs/heads/{prefix}/{n}".encode()
+            chunks.append(b"reset %s\nfrom :%d\n\n" % (ref, parent))
+    ref = f"refs/heads/{settings['devHead']}".encode()
+    chunks.append(b"reset %s\nfrom :%d\n\n" % (ref, history[-1]))
+    return b"".join(chunks)
+
+
+def BuildRepo(root, repo, settings):
+    remote = os.path.join(root, "remotes", f"{repo}.git")
+    repoPath = os.path.join(root, "repos", repo)
+    Git(["init", "-q", "--bare", remote])
+    Git(["init", "-q", repoPath])
+    Git(["fast-import", "--quiet"], repoPath, FastImportStream(settings))
+    Git(["remote", "add", "origin", remote], repoPath)
+    Git(["push", "-q", "origin", "--all"], repoPath)
+    Git(["fetch", "-q", "origin"], repoPath)
+    # upstreams for every branch, written at once instead of one
+    # "git branch -u" per branch
+    branches = Git(
+        ["for-each-ref", "--format=%(refname:short)", "refs/heads"], repoPath
+    ).split()
+    with open(os.path.join(repoPath, ".git", "config"), "a") as config:
+        for branch in branches:
+            config.write(
+                f'[branch "{branch}"]\n\tremote = origin\n'
+                f"\tmerge = refs/heads/{branch}\n"
+            )
+    # a share of the task branches are deleted on the remote: Remote Gone
+    gone = [b for b in branches if "/" in b][:: settings["goneEvery"]]
+    Git(
+        ["update-ref", "--stdin"],
+        remote,
+        "".join(f"delete refs/heads/{b}\n" for b in gone).encode(),
+    )
+    Git(["fetch", "-q", "--prune", "origin"], repoPath)
+    Git(["checkout", "-q", settings["mainBranch"]], repoPath)
+    # a few working tree changes for the status screen
+    with open(os.path.join(repoPath, "database", "schema0", "object0.sql"), "a") as f:
+        f.write("-- local change\n")
+    with open(os.path.join(repoPath, "database", "schema0", "new.sql"), "w") as f:
+        f.write("select 0 from dual;\n")
+
+
+def BuildWorkspace(root, settings):
+    os.makedirs(os.path.join(root, "remotes"))
+    os.makedirs(os.path.join(root, "repos"))
+    os.makedirs(os.path.join(root, "tool"))
+    repos = [f"repo{n:02d}" for n in range(settings["repos"])]
+    for repo in repos:
+        BuildRepo(root, repo, settings)
+    config = {
+        "excludeRepos": [],
+        "bitBucketOrg": "bench",
+        "localReposDir": os.path.join(root, "repos"),
+        "defaultRepo": "",
+        "shortcutRepo": repos[0],
+        "shortcutRepoMigration": "",
+        "devHeadBranch": settings["devHead"],
+        "mainDevBranch": settings["mainBranch"],
+        "mainProdBranch": "main",
+        "migrationFolder": "bench",
+        "databases": {"bench": repos},
+        "specificDevHead": {},
+        "specificMainDev": {},
+        "specificMigration": {},
+        "branchPrefixes": settings["prefixes"],
+        "releases": [],
+        "messageHistory": False,
+        "outputToFile": False,
+        "stepsPrefix": settings["prefixes"][0],
+        # background fetches would land in the next scenario's timings
+        "prefetch": False,
+    }
+    with open(os.path.join(root, "tool", "git-123.json"), "w") as f:
+        json.dump(config, f, indent=2)
+    return repos
+
+
+def LoadTool(toolDir):
+    # git-123.py reads git-123.json from the working directory on import.
+    os.chdir(toolDir)
+    toolPath = os.path.join(os.path.dirname(os.path.abspath(__file__)), "git-123.py")
+    spec = importlib.util.spec_from_file_location("git123", toolPath)
+    tool = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(tool)
+    return tool
+
+
+def Scenarios(tool, repos):
+    # name -> (setup, run, scripted answers)
+    repo = repos[0]
+    repoPath = os.path.join(tool.gLocalReposDir, repo)
+
+    def Select():
+        os.chdir(tool.gToolDir)
+        return tool.SelectRepo(False)
+
+    def SelectCold():
+        if os.path.exists(tool.gRepoIndexFile):
+            os.remove(tool.gRepoIndexFile)
+
+    def MainSetup():
+        os.chdir(repoPath)
+        tool.gRepoStatus = None
+        tool.gChangeSetCache.clear()
+
+    def InRepo():
+        os.chdir(repoPath)
+
+    def FakeSqlPlus():
+        os.chdir(repoPath)
+        tool.gSqlPlus = os.path.join(
+            os.path.dirname(os.path.abspath(__file__)), "git-123-fakesqlplus.py"
+        )
+
+    def Compile():
+        # "Compile Individually": one file at a time through the session kept
+        # for the schema, which later rounds reuse
+        files = sorted(os.listdir(os.path.join(repoPath, "database", "schema0")))
+        return [
+            tool.SqlSessionCommand(f"database/schema0/{f}", "schema0", "bench")
+            for f in files[:20]
+        ]
+
+    scenarios = {
+        "SelectRepo (cold index)": (SelectCold, Select, ["0"]),
+        "SelectRepo": (None, Select, ["0"]),
+        "Main status screen": (MainSetup, lambda: tool.Main(repo), ["9"]),
+        "GetLocalBranches": (InRepo, tool.GetLocalBranches, []),
+        "TrackingRemote": (
+            InRepo,
+            lambda: tool.TrackingRemote(tool.GetRepoStatus()),
+            [],
+        ),
+        "RemoteGone": (InRepo, lambda: tool.RemoteGone(tool.gMainBranch), ["2"]),
+        "RemoteGone (workspace)": (None, lambda: tool.RemoteGoneSweep(repos), ["2"]),
+    }
+    if os.name == "posix":
+        # the fake sqlplus is started through its #! line
+        scenarios["Compile Individually (fake sqlplus)"] = (FakeSqlPlus, Compile, [])
+    return scenarios
+
+
+def RunScenarios(tool, repos, rounds):
+    scriptedInput = ScriptedInput()
+    builtins.input = scriptedInput
+    subprocess.Popen = CountingPopen
+    results = {}
+    for name, (setup, run, answers) in Scenarios(tool, repos).items():
+        times = []
+        counts = []
+        for _ in range(rounds):
+            if setup:
+                setup()
+            scriptedInput.answers = list(answers)
+            CountingPopen.count = 0
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                run()
+            times.append(time.perf_counter() - start)
+            counts.append(CountingPopen.count)
+        results[name] = {
+            "median": statistics.median(times),
+            "max": max(times),
+            "subprocesses": max(counts),
+        }
+    return results
+
+
+def PrintResults(results, baseline=None):
+    rows = []
+    for name, result in results.items():
+        row = [
+            name,
+            f"{result['median'] * 1000:.1f}",
+            f"{result['max'] * 1000:.1f}",
+            str(result["subprocesses"]),
+        ]
+        if baseline and name in baseline:
+            before = baseline[name]
+            row.append(f"{(result['median'] / before['median'] - 1) * 100:+.0f}%")
+            row.append(f"{result['subprocesses'] - before['subprocesses']:+d}")
+        rows.append(row)
+    headers = ["Scenario", "Median ms", "Max ms", "Subprocesses"]
+    if baseline:
+        headers += ["vs baseline", "Subprocesses"]
+    widths = [max(len(c) for c in column) for column in zip(headers, *rows)]
+    for row in [headers, ["-" * w for w in widths]] + rows:
+        print("  ".join(c.ljust(w) for c, w in zip(row, widths)).rstrip())
+
+
+def Regressions(results, baseline, tolerance, floor):
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if not before:
+            continue
+        if result["subprocesses"] > before["subprocesses"]:
+            regressions.append(
+                f"{name}: {before['subprocesses']} -> "
+                f"{result['subprocesses']} subprocesses"
+            )
+        slower = result["median"] - before["median"]
+        if slower > before["median"] * tolerance and slower > floor:
+            regressions.append(
+                f"{name}: {before['median'] * 1000:.1f} -> "
+                f"{result['median'] * 1000:.1f} ms"
+            )
+    return regressions
+
+
+parser = argparse.ArgumentParser(description="git-123 benchmarks")
+parser.add_argument("--repos", type=int, default=4)
+parser.add_argument("--branches", type=int, default=2000, help="branches per repo")
+parser.add_argument("--commits", type=int, default=2000, help="history depth")
+parser.add_argument("--schemas", type=int, default=10)
+parser.add_argument("--files", type=int, default=200, help="files per schema")
+parser.add_argument("--rounds", type=int, default=5)
+parser.add_argument("--workspace", help="build into (or reuse) this directory")
+parser.add_argument("--save", help="write the results (JSON) to this file")
+parser.add_argument("--compare", help="baseline results (JSON) to compare with")
+parser.add_argument(
+    "--tolerance",
+    type=float,
+    default=0.25,
+    help="slowdown of the median, over the baseline, reported as a regression",
+)
+parser.add_argument(
+    "--floor",
+    type=float,
+    default=10,
+    help="slowdowns below this many milliseconds are noise, not regressions",
+)
+args = parser.parse_args()
+
+settings = {
+    "repos": args.repos,
+    "branches": args.branches,
+    "commits": args.commits,
+    "schemas": args.schemas,
+    "files": args.files,
+    "prefixes": ["issue", "feature"],
+    "mainBranch": "development",
+    "devHead": "devhead",
+    "goneEvery": 25,
+}
+root = args.workspace or tempfile.mkdtemp(prefix="git-123-bench-")
+if not os.path.exists(os.path.join(root, "tool", "git-123.json")):
+    start = time.perf_counter()
+    repos = BuildWorkspace(root, settings)
+    print(f"Workspace {root} built in {time.perf_counter() - start:.1f}s")
+else:
+    repos = sorted(os.listdir(os.path.join(root, "repos")))
+    print(f"Workspace {root} reused")
+
+try:
+    tool = LoadTool(os.path.join(root, "tool"))
+    results = RunScenarios(tool, repos, args.rounds)
+finally:
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    if not args.workspace:
+        shutil.rmtree(root, ignore_errors=True)
+
+baseline = None
+if args.compare:
+    with open(args.compare) as f:
+        baseline = json.load(f)["results"]
+print()
+PrintResults(results, baseline)
+if args.save:
+    with open(args.save, "w") as f:
+        json.dump({"settings": settings, "results": results}, f, indent=2)
+if baseline:
+    regressions = Regressions(results, baseline, args.tolerance, args.floor / 1000)
+    print()
+    for regression in regressions:
+        print(f"Regression: {regression}")
+    if not regressions:
+        print("No regressions.")
+    sys.exit(1 if regressions else 0)
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+import os
+import re
+import sys
+import time
+
+# A stand-in for sqlplus, to run the compile code (SqlSession, SqlCommand,
+# SqlErrors) without a database. Point git-123 at it:
+#
+#   "sqlplus": "/path/to/tool/git-123-fakesqlplus.py"
+#
+# It reads sqlplus commands from stdin like "sqlplus -S": "@file;" runs a
+# script, "show errors" lists the errors of the last script, "prompt text"
+# prints text, "exit" ends the session and "set ..." is ignored. A script
+# compiles with errors when it has lines such as
+#
+#   -- fake-error 3/5 PLS-00103: Encountered the symbol "END"
+#
+# The login argument is not checked. GIT123_FAKE_SQLPLUS_DELAY adds that many
+# seconds to every script, to stand in for the database.
+
+
+def ObjectName(filePath):
+    return os.path.splitext(os.path.basename(filePath))[0].upper()
+
+
+def RunScript(filePath, delay):
+    # Prints what sqlplus would and returns the errors for "show errors".
+    try:
+        with open(filePath, "r", encoding="utf-8", errors="replace") as script:
+            text = script.read()
+    except OSError:
+        print(f'SP2-0310: unable to open file "{filePath}"')
+        return None
+    time.sleep(delay)
+    errors = re.findall(r"^--\s*fake-error\s+(\d+/\d+)\s+(.+)$", text, re.M)
+    if errors:
+        print("Warning: Procedure created with compilation errors.")
+    else:
+        print("Procedure created.")
+    return ObjectName(filePath), errors
+
+
+def ShowErrors(lastScript):
+    if not lastScript or not lastScript[1]:
+        print("No errors.")
+        return
+    objectName, errors = lastScript
+    print(f"Errors for PROCEDURE {objectName}:")
+    print()
+    print("LINE/COL ERROR")
+    print("-------- " + "-" * 65)
+    for position, message in errors:
+        print(f"{position:<8} {message}")
+
+
+def Main():
+    delay = float(os.environ.get("GIT123_FAKE_SQLPLUS_DELAY", "0"))
+    lastScript = None
+    for line in sys.stdin:
+        command = line.strip()
+        if command.startswith("@"):
+            lastScript = RunScript(command[1:].rstrip(";").strip(), delay)
+        elif command.lower().startswith("show err"):
+            ShowErrors(lastScript)
+        elif command.lower().startswith("prompt"):
+            print(command[len("prompt") :].strip())
+        elif command.lower().startswith("exit"):
+            break
+        sys.stdout.flush()
+    return 0
+
+
+sys.exit(Main())
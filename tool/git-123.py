@@ -1,10 +1,36 @@
+import argparse
+import asyncio
+import atexit
+import codecs
+import cProfile
+import gzip
 import json
 import os
+import queue
 import re
+import shutil
+import signal
+import socket
 import subprocess
+import sys
+import threading
+import time
+import uuid
 import webbrowser
+from collections import deque
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ThreadPoolExecutor,
+    as_completed,
+    wait,
+)
 from datetime import datetime
 
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
 
 class RunCommandException(Exception):
     """Exception raised by RunCommand when exitcode is non-zero.
@@ -21,61 +47,740 @@ class RunCommandException(Exception):
         self.err = err
 
 
-def RunSqlCommand(sqlCommand, connectString):
-    global subprocess
-    out = None
-    err = None
-    exitcode = None
+class RepoStatus:
+    """Repository state parsed from one `git status --porcelain=v2 --branch -z`.
 
-    proc = subprocess.Popen(
-        ["sqlplus", "-S", "-L", connectString],
-        stdin=subprocess.PIPE,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
+    Attributes:
+        oid -- commit of HEAD, "(initial)" before the first commit
+        branch -- current branch, "(detached)" when HEAD is detached
+        upstream -- upstream branch (i.e. origin/issue/123) or None
+        ahead -- commits ahead of the upstream
+        behind -- commits behind the upstream
+        gone -- True when the upstream is set but no longer exists
+        entries -- (XY, path, origPath) for every changed or untracked path
+        databaseItems -- changed database/<schema>/*.sql paths by schema
+        changeSet -- database items committed on the branch since it left
+                     the main branch (filled in by Main)
+        trackedOnly -- True when untracked files were not scanned (`-uno`)
+                       except under database/, passed in as untracked
+    """
+
+    def __init__(self, out, trackedOnly=False, untracked=()):
+        self.oid = None
+        self.branch = ""
+        self.upstream = None
+        self.ahead = 0
+        self.behind = 0
+        self.gone = False
+        self.entries = []
+        self.databaseItems = {}
+        self.changeSet = {}
+        self.trackedOnly = trackedOnly
+
+        hasAheadBehind = False
+        fields = out.split("\0")
+        i = 0
+        while i < len(fields):
+            field = fields[i]
+            i += 1
+            if not field:
+                continue
+            if field.startswith("# "):
+                key, _, value = field[2:].partition(" ")
+                if key == "branch.oid":
+                    self.oid = value
+                elif key == "branch.head":
+                    self.branch = value
+                elif key == "branch.upstream":
+                    self.upstream = value
+                elif key == "branch.ab":
+                    ahead, behind = value.split()
+                    self.ahead = abs(int(ahead))
+                    self.behind = abs(int(behind))
+                    hasAheadBehind = True
+            elif field[0] == "1":
+                parts = field.split(" ", 8)
+                self.entries.append((parts[1], parts[8], None))
+            elif field[0] == "2":
+                # renames/copies are followed by the original path
+                parts = field.split(" ", 9)
+                self.entries.append((parts[1], parts[9], fields[i]))
+                i += 1
+            elif field[0] == "u":
+                parts = field.split(" ", 10)
+                self.entries.append((parts[1], parts[10], None))
+            elif field[0] in ("?", "!"):
+                self.entries.append((field[0] * 2, field[2:], None))
+        self.entries += [("??", path, None) for path in untracked if path]
+        self.gone = self.upstream is not None and not hasAheadBehind
+        self.databaseItems = DatabaseItems(
+            path for xy, path, origPath in self.entries if "D" not in xy
+        )
+
+    def counts(self):
+        if self.gone:
+            return "gone"
+        counts = []
+        if self.ahead:
+            counts.append(f"ahead {self.ahead}")
+        if self.behind:
+            counts.append(f"behind {self.behind}")
+        return ", ".join(counts)
+
+    def tracking(self):
+        if self.upstream is None:
+            return ""
+        counts = self.counts()
+        if counts:
+            return f"[{self.upstream}: {counts}]"
+        return f"[{self.upstream}]"
+
+    def lines(self):
+        # Same layout as `git status --short --branch`.
+        header = f"## {self.branch}"
+        if self.upstream is not None:
+            header += f"...{self.upstream}"
+            if self.counts():
+                header += f" [{self.counts()}]"
+        lines = [header]
+        for xy, path, origPath in self.entries:
+            xy = xy.replace(".", " ")
+            if origPath:
+                lines.append(f"{xy} {origPath} -> {path}")
+            else:
+                lines.append(f"{xy} {path}")
+        if not self.entries:
+            lines.append("nothing to commit, working tree clean")
+        if self.trackedOnly:
+            lines.append("(fast status: untracked files outside database/ not shown)")
+        return lines
+
+
+class SessionLog:
+    """Buffered, rotating session log.
+
+    Screen output goes to the text log and every command becomes one JSON
+    record (timestamp, repo, branch, command, exit code) in the JSONL log.
+    A log is rotated into numbered segments (git-123.log.1, ...) when it
+    grows past maxBytes or its segment is older than maxAgeDays; rotated
+    segments are gzipped when compress is set. The size of each log is
+    counted as it is written: calling tell() on a text file flushes it,
+    which would defeat the buffering.
+    """
+
+    def __init__(self, textPath, jsonPath, maxBytes, maxAgeDays, backups, compress):
+        self.textPath = textPath
+        self.jsonPath = jsonPath
+        self.maxBytes = maxBytes
+        self.maxAgeDays = maxAgeDays
+        self.backups = backups
+        self.compress = compress
+        self.session = uuid.uuid4().hex[:8]
+        self.lock = threading.Lock()
+        self.sizes = {}
+        self.text = self._open(textPath)
+        self.json = self._open(jsonPath)
+
+    def _open(self, path):
+        start = self._segmentStart(path)
+        if start is not None and time.time() - start > self.maxAgeDays * 86400:
+            self._rotate(path)
+        elif os.path.exists(path) and os.path.getsize(path) > self.maxBytes:
+            self._rotate(path)
+        logFile = open(path, "a", buffering=65536, encoding="utf-8")
+        self.sizes[path] = logFile.tell()
+        if self.sizes[path] == 0:
+            self._header(logFile, path)
+        return logFile
+
+    def _append(self, logFile, path, line):
+        logFile.write(line)
+        self.sizes[path] += len(line.encode("utf-8"))
+
+    def _header(self, logFile, path):
+        started = datetime.now().isoformat(timespec="seconds")
+        if path == self.jsonPath:
+            line = json.dumps({"ts": started, "segment": "start"}) + "\n"
+        else:
+            line = f"-- git-123 log segment started {started} --\n"
+        self._append(logFile, path, line)
+
+    def _segmentStart(self, path):
+        # from the header of the segment, else the file's mtime
+        try:
+            with open(path, "r", encoding="utf-8", errors="replace") as logFile:
+                line = logFile.readline().strip()
+        except OSError:
+            return None
+        match = re.search(r"\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d", line)
+        if match:
+            return datetime.fromisoformat(match.group()).timestamp()
+        return MTime(path)
+
+    def _rotate(self, path):
+        for number in range(self.backups, 0, -1):
+            for ext in (".gz", ""):
+                segment = f"{path}.{number}{ext}"
+                if not os.path.exists(segment):
+                    continue
+                if number == self.backups:
+                    os.remove(segment)
+                else:
+                    os.replace(segment, f"{path}.{number + 1}{ext}")
+        if self.backups < 1:
+            os.remove(path)
+        elif self.compress:
+            with open(path, "rb") as source:
+                with gzip.open(f"{path}.1.gz", "wb") as target:
+                    shutil.copyfileobj(source, target)
+            os.remove(path)
+        else:
+            os.replace(path, f"{path}.1")
+
+    def _roll(self, logFile, path):
+        if self.sizes[path] <= self.maxBytes:
+            return logFile
+        logFile.close()
+        self._rotate(path)
+        logFile = open(path, "a", buffering=65536, encoding="utf-8")
+        self.sizes[path] = 0
+        self._header(logFile, path)
+        return logFile
+
+    def write(self, text):
+        with self.lock:
+            if self.text.closed:
+                return  # a background thread ending after close()
+            self._append(self.text, self.textPath, text + "\n")
+            self.text = self._roll(self.text, self.textPath)
+
+    def record(self, **fields):
+        entry = {"ts": datetime.now().isoformat(timespec="milliseconds")}
+        entry["session"] = self.session
+        entry.update(fields)
+        with self.lock:
+            if self.json.closed:
+                return
+            self._append(self.json, self.jsonPath, json.dumps(entry) + "\n")
+            self.json = self._roll(self.json, self.jsonPath)
+
+    def close(self):
+        with self.lock:
+            for logFile in (self.text, self.json):
+                if not logFile.closed:
+                    logFile.close()
+
+
+def HeadBranch(repoPath):
+    # Branch name from .git/HEAD without running git.
+    try:
+        with open(os.path.join(GitDir(repoPath), "HEAD"), "r") as headFile:
+            head = headFile.read().strip()
+    except OSError:
+        return None
+    return head[16:] if head.startswith("ref: refs/heads/") else "(detached)"
+
+
+def OperationType(arr):
+    # fetch, pull, checkout, merge, ... for git; sqlplus; browser
+    if arr[0] == gSqlPlus:
+        return "sqlplus"
+    if arr[0] == "git":
+        args = iter(arr[1:])
+        for arg in args:
+            if arg in ("-C", "-c"):
+                next(args, None)
+            elif not arg.startswith("-"):
+                return arg
+    return os.path.basename(arr[0])
+
+
+def LogCommand(arr, exitcode, cwd=None, seconds=None, outSize=None):
+    # Timing for the end-of-session report, and the JSONL command log.
+    command = list(arr)
+    if command and command[0] == gSqlPlus:
+        # never log the password of the connect string
+        command = [re.sub(r"/[^@]*@", "/***@", c) for c in command]
+    repoPath = os.path.abspath(cwd or os.getcwd())
+    if seconds is not None:
+        with gCommandStatsLock:
+            gCommandStats.append(
+                {
+                    "type": OperationType(command),
+                    "command": command,
+                    "repo": os.path.basename(repoPath),
+                    "seconds": seconds,
+                    "exitcode": exitcode,
+                    "bytes": outSize,
+                }
+            )
+    if gSessionLog is None:
+        return
+    gSessionLog.record(
+        repo=os.path.basename(repoPath),
+        branch=HeadBranch(repoPath),
+        command=command,
+        exitcode=exitcode,
+        seconds=None if seconds is None else round(seconds, 3),
+        bytes=outSize,
     )
-    proc.stdin.write(sqlCommand)
-    out, err = proc.communicate()
-    exitcode = proc.returncode
 
-    outStr = out.decode("ascii")
-    errStr = err.decode("ascii")
 
-    if exitcode != 0:
-        raise RunCommandException(exitcode, outStr, errStr)
-    else:
-        return exitcode, outStr, errStr
+def DumpProfile(profilePath):
+    gProfiler.disable()
+    gProfiler.dump_stats(profilePath)
+    print(f"Profile written to {profilePath} (python -m pstats {profilePath})")
+
 
+def OpenBrowser(url):
+    start = time.perf_counter()
+    webbrowser.open(url)
+    LogCommand(["browser", url], 0, seconds=time.perf_counter() - start)
 
-def SqlCommand(filePaths, schema, db):
+
+def PrintTimingReport(top=5):
+    if not gCommandStats:
+        return
+    byType = {}
+    for stat in gCommandStats:
+        byType.setdefault(stat["type"], []).append(stat["seconds"])
+    Print_()
+    PrintIndented("**   Time by operation:")
+    PrintTable(
+        ["Operation", "Count", "Total", "Max"],
+        [
+            [op, len(times), f"{sum(times):.2f}s", f"{max(times):.2f}s"]
+            for op, times in sorted(byType.items(), key=lambda t: -sum(t[1]))
+        ],
+    )
+    PrintIndented(f"**   Slowest {top} operations:")
+    slowest = sorted(gCommandStats, key=lambda stat: -stat["seconds"])[:top]
+    PrintTable(
+        ["Time", "Exit", "Bytes", "Repository", "Command"],
+        [
+            [
+                f"{stat['seconds']:.2f}s",
+                stat["exitcode"],
+                stat["bytes"] if stat["bytes"] is not None else "-",
+                stat["repo"],
+                " ".join(stat["command"])[:60],
+            ]
+            for stat in slowest
+        ],
+    )
+
+
+def SqlCommand(filePaths, schema, db, echo=True, cwd=None, failFast=False):
+    # Runs the files one at a time through one sqlplus, each followed by
+    # "show errors", streaming the output as it arrives when echo is set.
+    # With failFast, the files after the first one with errors are not run.
+    # Returns (exitCode, [(filePath, output)] for the files run, err).
     file_paths_str = " ".join(filePaths)
-    sqlCommandStr = f"set define off;\r\nset serveroutput on;\r\n@{file_paths_str};\r\nshow errors;\r\nexit;"
-    sqlCommand = sqlCommandStr.encode()
-    connectString = f"{schema}/{db}@{db}"
-    print(f"Running {file_paths_str} as {connectString}")
-    exitCode, queryResult, errorMessage = RunSqlCommand(sqlCommand, connectString)
-    print(queryResult)
+    if echo:
+        print(f"Running {file_paths_str} as {schema}@{db}")
+    session = SqlSession(schema, db, cwd)
+    fileResults = []
+    try:
+        for filePath in filePaths:
+            output = session.run(filePath, print if echo else None)
+            fileResults.append((filePath, output))
+            if failFast and SqlErrors(output) and len(fileResults) < len(filePaths):
+                if echo:
+                    notRun = " ".join(filePaths[len(fileResults) :])
+                    print(f"Stopped after {filePath}, not run: {notRun}")
+                break
+    finally:
+        session.close()
+    return session.proc.returncode, fileResults, ""
+
+
+class SqlSession:
+    """A long-running sqlplus connection that runs scripts one at a time.
+
+    A prompt with a unique sentinel follows every script, so the output of
+    each script can be told apart without restarting sqlplus.
+
+    Attributes:
+        schema -- schema the session is logged in as
+        db -- database the session is connected to
+        proc -- the sqlplus process
+    """
+
+    def __init__(self, schema, db, cwd=None):
+        self.schema = schema
+        self.db = db
+        self.cwd = cwd
+        self.sentinel = f"-- git-123 {uuid.uuid4().hex} --"
+        self.lines = queue.Queue()
+        self.proc = subprocess.Popen(
+            [gSqlPlus, "-S", "-L", f"{schema}/{db}@{db}"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            cwd=cwd,
+        )
+        reader = threading.Thread(target=self._read, daemon=True)
+        reader.start()
+        self._write("set define off;\r\nset serveroutput on;\r\n")
+
+    def _read(self):
+        for line in self.proc.stdout:
+            self.lines.put(line.decode("utf-8", errors="replace").rstrip("\r\n"))
+        self.lines.put(None)
+
+    def _write(self, text):
+        self.proc.stdin.write(text.encode())
+        self.proc.stdin.flush()
+
+    def alive(self):
+        return self.proc.poll() is None
+
+    def run(self, filePath, onLine=None):
+        # Returns the output of one script, up to its sentinel. onLine is
+        # called with every line as it arrives.
+        output = []
+        start = time.perf_counter()
+        try:
+            self._write(
+                f"@{filePath};\r\nshow errors;\r\nprompt {self.sentinel}\r\n"
+            )
+            while True:
+                line = self.lines.get(timeout=gSqlTimeout)
+                if line is None:
+                    raise RunCommandException(self.proc.wait(), "\n".join(output), "")
+                if line == self.sentinel:
+                    LogCommand(
+                        [gSqlPlus, f"{self.schema}@{self.db}", f"@{filePath}"],
+                        0,
+                        self.cwd,
+                        time.perf_counter() - start,
+                        sum(len(o) + 1 for o in output),
+                    )
+                    return "\n".join(output)
+                output.append(line)
+                if onLine:
+                    onLine(line)
+        except (OSError, queue.Empty):
+            self.close()
+            raise RunCommandException(self.proc.returncode, "\n".join(output), "")
+
+    def close(self):
+        if self.alive():
+            try:
+                self._write("exit;\r\n")
+                self.proc.stdin.close()
+                self.proc.wait(timeout=10)
+            except (OSError, subprocess.TimeoutExpired):
+                self.proc.kill()
+                self.proc.wait()
+
+
+def GetSqlSession(schema, db, cwd=None):
+    # One session per schema, database and directory: sqlplus resolves the
+    # relative script paths from the directory it was started in (another
+    # repo of the same database, or the devhead worktree).
+    cwd = os.path.abspath(cwd or os.getcwd())
+    key = (schema, db, cwd)
+    session = gSqlSessions.get(key)
+    if session is None or not session.alive():
+        session = gSqlSessions[key] = SqlSession(schema, db, cwd)
+    return session
+
+
+def CloseSqlSessions():
+    for session in gSqlSessions.values():
+        session.close()
+    gSqlSessions.clear()
+
+
+def SqlSessionCommand(filePath, schema, db, cwd=None):
+    print(f"Running {filePath} as {schema}@{db} (session)")
+    return GetSqlSession(schema, db, cwd).run(filePath, print)
+
+
+def SqlErrors(output):
+    # Compile errors as {"object", "line", "column", "code", "message"}: the
+    # rows of "show errors" tables, and ORA-/PLS-/SP2- lines. "created with
+    # compilation errors" warnings only count when no table rows explain them.
+    header = re.compile(r"Errors for (.+?):?$")
+    row = re.compile(r"(\d+)/(\d+)\s+(?:((?:ORA|PLS|SP2)-\d+|PL/SQL):\s*)?(.*)$")
+    coded = re.compile(r"(ORA|PLS|SP2)-\d+")
+    errors = []
+    warnings = []
+    objectName = None
+    inTable = False
+    for line in output.splitlines():
+        text = line.strip()
+        match = header.match(text)
+        if match:
+            objectName = match.group(1)
+            inTable = False
+            continue
+        if text.startswith("LINE/COL"):
+            inTable = True
+            continue
+        if not text:
+            if inTable:
+                inTable = False
+                objectName = None
+            continue
+        if text.startswith("---"):
+            continue
+        match = row.match(text)
+        if inTable and match:
+            errors.append(
+                {
+                    "object": objectName,
+                    "line": int(match.group(1)),
+                    "column": int(match.group(2)),
+                    "code": match.group(3) or "",
+                    "message": match.group(4),
+                }
+            )
+        elif inTable and errors and line[:1].isspace():
+            # long messages wrap onto indented lines
+            errors[-1]["message"] += " " + text
+        elif coded.match(text):
+            code, message = text.split(":", 1) if ":" in text else (text, "")
+            position = re.search(r"line (\d+), column (\d+)", message)
+            errors.append(
+                {
+                    "object": objectName,
+                    "line": int(position.group(1)) if position else None,
+                    "column": int(position.group(2)) if position else None,
+                    "code": code,
+                    "message": message.strip(),
+                }
+            )
+        elif text.startswith("Warning:"):
+            warnings.append(
+                {
+                    "object": objectName,
+                    "line": None,
+                    "column": None,
+                    "code": "Warning",
+                    "message": text[8:].strip(),
+                }
+            )
+    return errors or warnings
+
+
+def PrintSqlErrors(fileResults, level=2):
+    rows = [
+        [
+            filePath,
+            error["object"] or "",
+            "" if error["line"] is None else error["line"],
+            "" if error["column"] is None else error["column"],
+            ": ".join(filter(None, [error["code"], error["message"]]))[:80],
+        ]
+        for filePath, output in fileResults
+        for error in SqlErrors(output)
+    ]
+    if rows:
+        Print_()
+        PrintIndented(f"**   {len(rows)} compile error(s):", level)
+        PrintTable(["File", "Object", "Line", "Col", "Error"], rows, level)
+
+
+def CompileSchema(schema, dbFiles, db, cwd=None):
+    # Runs one schema without printing so parallel schemas don't interleave.
+    start = time.perf_counter()
+    fileResults = []
+    try:
+        exitcode, fileResults, err = SqlCommand(
+            dbFiles, schema, db, echo=False, cwd=cwd, failFast=gCompileFailFast
+        )
+        out = "\n".join(output for filePath, output in fileResults)
+    except RunCommandException as e:
+        exitcode, out, err = e.exitcode, e.out, e.err
+    except OSError as e:
+        exitcode, out, err = None, "", str(e)
+    return {
+        "schema": schema,
+        "files": dbFiles,
+        "fileResults": fileResults,
+        "exitcode": exitcode,
+        "out": out,
+        "err": err,
+        "seconds": time.perf_counter() - start,
+    }
+
+
+def CompileParallel(databaseItems, db, blobs):
+    schemas = list(databaseItems)
+    PrintIndented(
+        f"**   Compiling {len(schemas)} schemas ({gCompileWorkers} at a time)", 2
+    )
+    results = {}
+    with ThreadPoolExecutor(max_workers=gCompileWorkers) as executor:
+        futures = [
+            executor.submit(CompileSchema, schema, dbFiles, db)
+            for schema, dbFiles in databaseItems.items()
+        ]
+        for future in as_completed(futures):
+            result = future.result()
+            results[result["schema"]] = result
+            PrintIndented(
+                f"{result['schema']} finished in {result['seconds']:.1f}s", 3
+            )
+
+    # each schema's output is printed in one piece, in the original order
+    for schema in schemas:
+        result = results[schema]
+        Print_()
+        Print_(f"Running {' '.join(result['files'])} as {schema}@{db}")
+        Print_(result["out"])
+        if result["err"]:
+            Print_(result["err"])
+        RecordCompiled(db, schema, result["fileResults"], blobs)
+
+    Print_()
+    PrintTable(
+        ["Schema", "Files", "Exit", "Errors", "Time"],
+        [
+            [
+                schema,
+                len(results[schema]["files"]),
+                results[schema]["exitcode"],
+                len(SqlErrors(results[schema]["out"])),
+                f"{results[schema]['seconds']:.1f}s",
+            ]
+            for schema in schemas
+        ],
+        2,
+    )
+    PrintSqlErrors(
+        [fileResult for s in schemas for fileResult in results[s]["fileResults"]]
+    )
+    Print_()
+
+
+def LoadCompileCache():
+    global gCompileCache
+    if gCompileCache is None:
+        try:
+            with open(gCompileCacheFile, "r") as cacheFile:
+                gCompileCache = json.load(cacheFile)
+        except (OSError, ValueError):
+            gCompileCache = {}
+    return gCompileCache
 
 
-def RunCommand(arr, input=None):
+def SaveCompileCache():
+    with open(gCompileCacheFile, "w") as cacheFile:
+        json.dump(LoadCompileCache(), cacheFile, indent=2, sort_keys=True)
+
+
+def HashFiles(filePaths, cwd=None):
+    # Blob hashes of the working tree files, {} when any of them is missing.
+    if not filePaths:
+        return {}
+    try:
+        exitcode, out, err = RunCommand(
+            ["git", "hash-object", "--"] + filePaths, cwd=cwd
+        )
+    except RunCommandException:
+        return {}
+    return dict(zip(filePaths, out.split()))
+
+
+def IsCompiled(db, schema, filePath, blob):
+    entry = LoadCompileCache().get(db, {}).get(schema, {}).get(filePath)
+    return blob is not None and entry is not None and entry["blob"] == blob
+
+
+def RecordCompiled(db, schema, fileResults, blobs):
+    # Only files that compiled without errors are remembered.
+    with gCompileCacheLock:
+        schemaCache = LoadCompileCache().setdefault(db, {}).setdefault(schema, {})
+        for filePath, output in fileResults:
+            blob = blobs.get(filePath)
+            if blob and not SqlErrors(output):
+                schemaCache[filePath] = {
+                    "blob": blob,
+                    "compiled": datetime.now().isoformat(timespec="seconds"),
+                }
+            else:
+                schemaCache.pop(filePath, None)
+        SaveCompileCache()
+
+
+def CompileCacheMenu(db):
+    options = [
+        "Show Cache",        # 0
+        f"Clear {db} Cache", # 1
+        "Clear All Cache",   # 2
+        "Return",            # 3
+    ]
+    optionInt = GetResponse(options, 3)
+    cache = LoadCompileCache()
+    if optionInt == 0:
+        rows = [
+            [schema, filePath, entry["blob"][:10], entry["compiled"]]
+            for schema, files in sorted(cache.get(db, {}).items())
+            for filePath, entry in sorted(files.items())
+        ]
+        if rows:
+            PrintTable(["Schema", "File", "Blob", "Compiled"], rows, 3)
+        else:
+            PrintIndented(f"**   Nothing cached for {db}", 3)
+    elif optionInt == 1:
+        cache.pop(db, None)
+        SaveCompileCache()
+        PrintIndented(f"**   Cleared {db} cache", 3)
+    elif optionInt == 2:
+        cache.clear()
+        SaveCompileCache()
+        PrintIndented("**   Cleared compile cache", 3)
+    elif optionInt == 3:
+        pass
+
+
+def RunCommand(arr, input=None, cwd=None):
     # Stack Overflow: https://stackoverflow.com/questions/1996518/retrieving-the-output-of-subprocess-call
     # Note, Out and Err are buffered in memory, so do not use this method if
     # the data size is large or unlimited.
     out = None
     err = None
     exitcode = None
+    CancelPrefetch(arr, cwd)
+    start = time.perf_counter()
+    if arr[0] == "git" and gDaemonSocket:
+        # the daemon runs it, one command per repo at a time, then re-probes
+        response = DaemonRequest(
+            "run", args=arr, input=input, cwd=os.path.abspath(cwd or os.getcwd())
+        )
+        if response is not None:
+            exitcode = response["exitcode"]
+            outStr = response["out"]
+            errStr = response["err"]
+            seconds = time.perf_counter() - start
+            LogCommand(arr, exitcode, cwd, seconds, len(outStr) + len(errStr))
+            if exitcode != 0:
+                raise RunCommandException(exitcode, outStr, errStr)
+            return exitcode, outStr, errStr
     if input is None:
-        proc = subprocess.Popen(arr, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        proc = subprocess.Popen(
+            arr, stdout=subprocess.PIPE, stderr=subprocess.PIPE, cwd=cwd
+        )
         out, err = proc.communicate()
         exitcode = proc.returncode
     else:
         proc = subprocess.Popen(
-            arr, stdout=subprocess.PIPE, stderr=subprocess.PIPE, stdin=subprocess.PIPE
+            arr,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            stdin=subprocess.PIPE,
+            cwd=cwd,
         )
-        out, err = proc.communicate(input.encode("ascii"))
+        out, err = proc.communicate(input.encode("utf-8"))
         exitcode = proc.returncode
+    seconds = time.perf_counter() - start
+    LogCommand(arr, exitcode, cwd, seconds, len(out) + len(err))
 
-    outStr = out.decode("ascii")
-    errStr = err.decode("ascii")
+    outStr = out.decode("utf-8", errors="replace")
+    errStr = err.decode("utf-8", errors="replace")
 
     if exitcode != 0:
         raise RunCommandException(exitcode, outStr, errStr)
@@ -83,18 +788,373 @@ def RunCommand(arr, input=None):
         return exitcode, outStr, errStr
 
 
+def StreamCommand(arr, cwd=None, tailLines=200, maxLine=65536):
+    # Yields output lines (stdout and stderr merged) as they arrive instead of
+    # buffering everything like RunCommand. Progress updates that end in a bare
+    # carriage return are yielded with the trailing "\r" kept. Only the last
+    # tailLines lines are kept for the RunCommandException.
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    lineEnd = re.compile(r"\r\n|\n|\r(?!$)")
+    tail = deque(maxlen=tailLines)
+    CancelPrefetch(arr, cwd)
+    started = time.perf_counter()
+    outSize = 0
+    proc = subprocess.Popen(
+        arr, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, cwd=cwd
+    )
+    try:
+        pending = ""
+        while True:
+            chunk = proc.stdout.read1(4096)
+            outSize += len(chunk)
+            pending += decoder.decode(chunk, final=not chunk)
+            start = 0
+            for match in lineEnd.finditer(pending):
+                line = pending[start : match.start()]
+                if match.group() == "\r":
+                    line += "\r"
+                else:
+                    tail.append(line)
+                start = match.end()
+                yield line
+            pending = pending[start:]
+            if len(pending) > maxLine:
+                tail.append(pending)
+                yield pending
+                pending = ""
+            if not chunk:
+                break
+        if pending.rstrip("\r"):
+            tail.append(pending.rstrip("\r"))
+            yield pending.rstrip("\r")
+        exitcode = proc.wait()
+        LogCommand(arr, exitcode, cwd, time.perf_counter() - started, outSize)
+        DaemonRequest("invalidate", cwd=os.path.abspath(cwd or os.getcwd()))
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+        proc.stdout.close()
+
+    if exitcode != 0:
+        raise RunCommandException(exitcode, "\n".join(tail), "")
+
+
+async def Probe(arr, cwd, semaphore):
+    async with semaphore:
+        start = time.perf_counter()
+        proc = await asyncio.create_subprocess_exec(
+            *arr, stdout=subprocess.PIPE, stderr=subprocess.PIPE, cwd=cwd
+        )
+        out, err = await proc.communicate()
+    LogCommand(arr, proc.returncode, cwd, time.perf_counter() - start, len(out + err))
+    outStr = out.decode("utf-8", errors="replace")
+    errStr = err.decode("utf-8", errors="replace")
+    if proc.returncode != 0:
+        raise RunCommandException(proc.returncode, outStr, errStr)
+    return proc.returncode, outStr, errStr
+
+
+def RunProbes(probes):
+    # Runs read-only commands [(arr, cwd)] at the same time, at most
+    # gProbesPerRepo per repo, and returns their (exitcode, out, err) in order;
+    # a failed probe returns its RunCommandException. Mutating commands go
+    # through RunCommand and StreamCommand, one after another.
+    if gDaemonSocket or len(probes) == 1:
+        # the daemon runs every command of a repo
+        results = []
+        for arr, cwd in probes:
+            try:
+                results.append(RunCommand(arr, cwd=cwd))
+            except RunCommandException as e:
+                results.append(e)
+        return results
+
+    async def gather():
+        semaphores = {}
+        tasks = []
+        for arr, cwd in probes:
+            repoPath = os.path.abspath(cwd or os.getcwd())
+            if repoPath not in semaphores:
+                semaphores[repoPath] = asyncio.Semaphore(gProbesPerRepo)
+            tasks.append(Probe(arr, repoPath, semaphores[repoPath]))
+        return await asyncio.gather(*tasks, return_exceptions=True)
+
+    results = asyncio.run(gather())
+    for result in results:
+        if isinstance(result, BaseException) and not isinstance(
+            result, RunCommandException
+        ):
+            raise result
+    return results
+
+
+def DatabaseItems(paths, databaseItems=None):
+    # Groups database/<schema>/*.sql paths by schema, adding to databaseItems.
+    pattern = re.compile(r"database\/(\w+)\/\S+\.sql$")
+    databaseItems = databaseItems if databaseItems is not None else {}
+    for path in paths:
+        match = pattern.search(path)
+        if match:
+            schema = match.group(1)
+            if schema not in databaseItems:
+                databaseItems[schema] = []
+            if match.group(0) not in databaseItems[schema]:
+                databaseItems[schema].append(match.group(0))
+    return databaseItems
+
+
+def BranchChangeSet(repoStatus, mainBranch, cwd=None, devHead=None, mergeBase=None):
+    # SQL files committed on the task branch since its merge-base with
+    # mainBranch. The diff is cached by (HEAD, merge-base). mergeBase is the
+    # merge-base when already probed, "" when it could not be found.
+    devHead = devHead or gSelectedDevHead
+    if repoStatus.branch in (mainBranch, devHead, gMainProdBranch):
+        return {}
+    if repoStatus.oid in (None, "(initial)"):
+        return {}
+    if mergeBase is None:
+        try:
+            exitcode, out, err = RunCommand(
+                ["git", "merge-base", "HEAD", mainBranch], cwd=cwd
+            )
+            mergeBase = out.strip()
+        except RunCommandException:
+            mergeBase = ""
+    if not mergeBase:
+        return {}
+    key = (repoStatus.oid, mergeBase)
+    if key not in gChangeSetCache:
+        exitcode, out, err = RunCommand(
+            ["git", "diff", "--name-only", "-z", "--diff-filter=d", key[1], key[0]],
+            cwd=cwd,
+        )
+        gChangeSetCache[key] = DatabaseItems(out.split("\0"))
+    return gChangeSetCache[key]
+
+
+def ProbeRepo(mainBranch, cwd=None, fullScan=False):
+    # The Main screen probes: status and the merge-base with mainBranch run
+    # at the same time, then the diff for the branch's SQL change set. With
+    # the fast status profile, untracked files are skipped unless fullScan,
+    # except under database/ so new SQL files are still compiled.
+    trackedOnly = not fullScan and FastStatus(cwd)
+    if gDaemonSocket and not trackedOnly:
+        repoStatus = GetRepoStatus(cwd)
+        repoStatus.changeSet = BranchChangeSet(repoStatus, mainBranch, cwd)
+        return repoStatus
+    command = ["git", "status", "--porcelain=v2", "--branch", "-z"]
+    if trackedOnly:
+        command.append("-uno")
+    probes = [(command, cwd)]
+    if trackedOnly:
+        probes.append(
+            (
+                ["git", "ls-files", "-o", "--exclude-standard", "-z", "--", "database"],
+                cwd,
+            )
+        )
+    if HeadBranch(os.path.abspath(cwd or os.getcwd())) not in (
+        mainBranch,
+        gSelectedDevHead,
+        gMainProdBranch,
+    ):
+        probes.append((["git", "merge-base", "HEAD", mainBranch], cwd))
+    results = RunProbes(probes)
+    status = results.pop(0)
+    untracked = results.pop(0) if trackedOnly else (0, "", "")
+    for result in (status, untracked):
+        if isinstance(result, RunCommandException):
+            raise result
+    repoStatus = RepoStatus(status[1], trackedOnly, untracked[1].split("\0"))
+    mergeBase = None
+    if results:
+        mergeBase = results[0]
+        if isinstance(mergeBase, RunCommandException):
+            mergeBase = ""
+        else:
+            mergeBase = mergeBase[1].strip()
+    repoStatus.changeSet = BranchChangeSet(
+        repoStatus, mainBranch, cwd, mergeBase=mergeBase
+    )
+    return repoStatus
+
+
+def GetRepoStatus(cwd=None, optionalLocks=True):
+    # optionalLocks=False keeps background probes from rewriting the index.
+    response = DaemonRequest("status", cwd=os.path.abspath(cwd or os.getcwd()))
+    if response is not None:
+        return RepoStatus(response["out"])
+    command = ["git", "status", "--porcelain=v2", "--branch", "-z"]
+    if not optionalLocks:
+        command.insert(1, "--no-optional-locks")
+    exitcode, out, err = RunCommand(command, cwd=cwd)
+    return RepoStatus(out)
+
+
+def FsmonitorSupported():
+    # The built-in fsmonitor daemon (git 2.36+, Windows and macOS builds).
+    global gFsmonitorSupported
+    if gFsmonitorSupported is None:
+        try:
+            exitcode, out, err = RunCommand(["git", "version", "--build-options"])
+            gFsmonitorSupported = "fsmonitor--daemon" in out
+        except RunCommandException:
+            gFsmonitorSupported = False
+    return gFsmonitorSupported
+
+
+def FastStatus(cwd=None):
+    # True when the repo has the fast status profile (git-123.fastStatus in
+    # its git config). Read once per repo.
+    repoPath = os.path.abspath(cwd or os.getcwd())
+    if repoPath not in gFastStatusRepos:
+        try:
+            exitcode, out, err = RunCommand(
+                ["git", "config", "--bool", "--get", "git-123.fastStatus"],
+                cwd=repoPath,
+            )
+            gFastStatusRepos[repoPath] = out.strip() == "true"
+        except RunCommandException:
+            gFastStatusRepos[repoPath] = False  # not set
+    return gFastStatusRepos[repoPath]
+
+
+def SetFastStatus(enable, cwd=None):
+    # Turns the fast status profile on or off: the untracked cache, the
+    # built-in fsmonitor where git has it, and tracked-only status in Main.
+    repoPath = os.path.abspath(cwd or os.getcwd())
+    settings = ["core.untrackedCache", "git-123.fastStatus"]
+    if FsmonitorSupported():
+        settings.append("core.fsmonitor")
+    for setting in settings:
+        if enable:
+            RunCommand(["git", "config", setting, "true"], cwd=repoPath)
+            continue
+        try:
+            RunCommand(["git", "config", "--unset", setting], cwd=repoPath)
+        except RunCommandException as e:
+            if e.exitcode != 5:  # 5 - was not set
+                raise
+    if not enable and FsmonitorSupported():
+        try:
+            RunCommand(["git", "fsmonitor--daemon", "stop"], cwd=repoPath)
+        except RunCommandException:
+            pass  # not running
+    gFastStatusRepos[repoPath] = enable
+
+
+def StatusLatency(cwd=None, rounds=5):
+    # Median `git status` time with each setting. Settings are passed with
+    # -c, so the repo config is not changed; the untracked cache and the
+    # fsmonitor daemon are warmed up by one run before they are timed.
+    repoPath = os.path.abspath(cwd or os.getcwd())
+    variants = [
+        ("Full scan", False, False, "-unormal"),
+        ("Untracked cache", True, False, "-unormal"),
+        ("Tracked only (-uno)", False, False, "-uno"),
+    ]
+    if FsmonitorSupported():
+        variants[2:2] = [("Untracked cache + fsmonitor", True, True, "-unormal")]
+        variants.append(("Tracked only + fsmonitor", False, True, "-uno"))
+    results = []
+    for label, untrackedCache, fsmonitor, untracked in variants:
+        command = [
+            "git",
+            "-c",
+            f"core.untrackedCache={str(untrackedCache).lower()}",
+            "-c",
+            f"core.fsmonitor={str(fsmonitor).lower()}",
+            "status",
+            "--porcelain=v2",
+            "--branch",
+            "-z",
+            untracked,
+        ]
+        if untrackedCache or fsmonitor:
+            RunCommand(command, cwd=repoPath)
+        else:
+            # keeps a disabled untracked cache from being dropped from the index
+            command.insert(1, "--no-optional-locks")
+        times = []
+        for _ in range(rounds):
+            start = time.perf_counter()
+            exitcode, out, err = RunCommand(command, cwd=repoPath)
+            times.append(time.perf_counter() - start)
+        results.append(
+            {
+                "setting": label,
+                "seconds": sorted(times)[len(times) // 2],
+                "entries": len(RepoStatus(out).entries),
+            }
+        )
+    if FsmonitorSupported() and not FastStatus(repoPath):
+        try:
+            RunCommand(["git", "fsmonitor--daemon", "stop"], cwd=repoPath)
+        except RunCommandException:
+            pass
+    return results
+
+
+def PrintStatusLatency(results):
+    full = results[0]["seconds"]
+    rows = [
+        [
+            r["setting"],
+            f"{r['seconds'] * 1000:.0f} ms",
+            f"{(full - r['seconds']) / full * 100:.0f}%" if full else "-",
+            r["entries"],
+        ]
+        for r in results
+    ]
+    PrintTable(["Setting", "Status", "Saved", "Entries"], rows)
+
+
+def FastStatusMenu(repo):
+    # Returns the next screen for Navigate().
+    global gRepoStatus
+    enabled = FastStatus()
+    Print_()
+    PrintIndented(
+        f"**   Fast status for {repo}: {'on' if enabled else 'off'}"
+        + ("" if FsmonitorSupported() else " (this git has no built-in fsmonitor)"),
+        2,
+    )
+    toggle = "Disable Fast Status" if enabled else "Enable Fast Status"
+    options = [
+        "Full Scan",             # 0
+        toggle,                  # 1
+        "Status Latency Report", # 2
+        "Main Menu",             # 3
+    ]
+    optionInt = GetResponse(options, 2)
+    if optionInt == 0:
+        gRepoStatus = ProbeRepo(gMainBranch, fullScan=True)
+        return "menu"
+    elif optionInt == 1:
+        SetFastStatus(not enabled)
+        return "refresh"
+    elif optionInt == 2:
+        PrintIndented("**   git status, median of 5 runs:", 2)
+        PrintStatusLatency(StatusLatency())
+        return "menu"
+    elif optionInt == 3:
+        return "menu"
+
+
 def Print_(text=None):
     global gOutputToFile
-    global gOutputFile
+    global gSessionLog
+    if text and text.endswith("\r"):
+        # live progress from StreamCommand, overwritten by the next line
+        print(text, end="", flush=True)
+        return
     if text:
         print(text)
     else:
         print()
-    if gOutputToFile:
-        if text:
-            print(text, file=gOutputFile)
-        else:
-            print(file=gOutputFile)
+    if gOutputToFile and gSessionLog:
+        gSessionLog.write(text or "")
 
 
 def PrintIndented(text, level=1):
@@ -109,18 +1169,53 @@ def PrintIndented(text, level=1):
             Print_(indentation + line)
 
 
-def GetResponse(options, level=1, message="    >>> ", returnInt=True):
+def PrintTable(headers, rows, level=1):
+    widths = [len(h) for h in headers]
+    for row in rows:
+        for i, cell in enumerate(row):
+            widths[i] = max(widths[i], len(str(cell)))
+    line = "  ".join("-" * w for w in widths)
+    PrintIndented(line, level)
+    PrintIndented(
+        "  ".join(h.ljust(widths[i]) for i, h in enumerate(headers)).rstrip(), level
+    )
+    PrintIndented(line, level)
+    for row in rows:
+        PrintIndented(
+            "  ".join(str(c).ljust(widths[i]) for i, c in enumerate(row)).rstrip(),
+            level,
+        )
+    PrintIndented(line, level)
+
+
+def PrintOptions(options, level=1, numbers=None):
+    numbers = numbers if numbers is not None else range(len(options))
     m = len(max(options, key=len))
-    s = "-" * 16 + "-" * m
+    # room for numbers past two digits (FilterMenu pages)
+    w = 2 * max(0, max(len(str(x)) for x in numbers) - 2)
+    s = "-" * (16 + w) + "-" * m
     PrintIndented("\n" + s, level)
-    for x in range(len(options)):
-        l = len(options[x])
-        p = "-" * (m - l + 3)
-        if x > 9:
-            p = "-" * (m - l + 1)
-        PrintIndented(f"-> {str(x)} - {options[x]} {p} {str(x)} <-", level)
+    for x, option in zip(numbers, options):
+        l = len(option)
+        p = "-" * (m - l + 3 - 2 * (len(str(x)) - 1) + w)
+        PrintIndented(f"-> {str(x)} - {option} {p} {str(x)} <-", level)
     PrintIndented(s + "\n", level)
-    optionStr = input(message)
+
+
+def Prompt(message):
+    # input() for the menus; the time spent waiting is idle time for
+    # background work.
+    global gIdleSince
+    gIdleSince = time.time()
+    try:
+        return input(message)
+    finally:
+        gIdleSince = None
+
+
+def GetResponse(options, level=1, message="    >>> ", returnInt=True):
+    PrintOptions(options, level)
+    optionStr = Prompt(message)
     if optionStr == "00":
         return 200
     elif optionStr == "130":
@@ -144,6 +1239,86 @@ def GetResponse(options, level=1, message="    >>> ", returnInt=True):
         return optionInt, option
 
 
+class MenuIndex:
+    """Search index over menu options for FilterMenu.
+
+    Substring matches keep the original order and come first, followed by
+    fuzzy matches (the query letters appear in order). A query that extends
+    the previous one only searches the previous matches.
+    """
+
+    def __init__(self, options):
+        self.options = options
+        self.keys = [option.lower() for option in options]
+        self.query = ""
+        self.matches = list(range(len(options)))
+
+    def search(self, query):
+        query = query.lower()
+        candidates = range(len(self.keys))
+        if self.query and query.startswith(self.query):
+            candidates = self.matches
+        substring = []
+        fuzzy = []
+        for i in candidates:
+            key = self.keys[i]
+            if query in key:
+                substring.append(i)
+            else:
+                letters = iter(key)
+                if all(c in letters for c in query):
+                    fuzzy.append(i)
+        self.query = query
+        self.matches = substring + fuzzy
+        return self.matches
+
+
+def FilterMenu(options, level=1, message="    >>> "):
+    # Paged menu for long lists: a number selects, text (or /text for digits)
+    # filters, + and - change page, * clears the filter, Enter cancels.
+    # Returns the index into options, or None when cancelled (any int can be
+    # an index, so there is no cancel code as with GetResponse).
+    index = MenuIndex(options)
+    matches = index.matches
+    page = 0
+    while True:
+        pages = max(1, -(-len(matches) // gMenuPageSize))
+        page = min(page, pages - 1)
+        first = page * gMenuPageSize
+        shown = matches[first : first + gMenuPageSize]
+        if shown:
+            PrintOptions(
+                [options[i] for i in shown],
+                level,
+                range(first, first + len(shown)),
+            )
+        filterText = f"'{index.query}' " if index.query else ""
+        PrintIndented(
+            f"{filterText}{len(matches)} of {len(options)}, page {page + 1}/{pages}"
+            "  (text: filter, +/-: page, *: clear)",
+            level,
+        )
+        optionStr = Prompt(message).strip()
+        if not optionStr:
+            return None
+        elif optionStr == "+":
+            page += 1
+        elif optionStr == "-":
+            page = max(0, page - 1)
+        elif optionStr == "*":
+            matches = index.search("")
+            page = 0
+        elif optionStr.isdigit():
+            optionInt = int(optionStr)
+            if optionInt >= len(matches):
+                raise Exception(" Invalid Selection.")
+            Print_(f" Selected: {options[matches[optionInt]]}")
+            return matches[optionInt]
+        else:
+            matches = index.search(optionStr.lstrip("/"))
+            page = 0
+
+
 def SelectMessage():
     global gMessages
     commitMessage = None
@@ -226,9 +1401,9 @@ def GitCommands(
 
     def fetch(arg=None):
         Print_("Fetch...")
-        command = gitFetch[:] + arg if arg else gitFetch
-        exitcode, out, err = RunCommand(command)
-        Print_(out)
+        command = gitFetch + ["--progress"] + (arg or [])
+        for line in StreamCommand(command):
+            Print_(line)
 
     def merge(arg):
         Print_(f"Merge {arg}")
@@ -239,16 +1414,16 @@ def GitCommands(
 
     def pull(arg=None):
         Print_("Pull...")
-        command = gitPull[:] + arg if arg else gitPull
-        exitcode, out, err = RunCommand(command)
-        Print_(out)
+        command = gitPull + ["--progress"] + (arg or [])
+        for line in StreamCommand(command):
+            Print_(line)
 
     def push(arg=None):
         m = "Push to New..." if arg else "Push..."
-        command = gitPush[:] + arg if arg else gitPush
+        command = gitPush + ["--progress"] + (arg or [])
         Print_(m)
-        exitcode, out, err = RunCommand(command)
-        Print_(out)
+        for line in StreamCommand(command):
+            Print_(line)
 
     return {
         "addAll": addAll,
@@ -263,22 +1438,244 @@ def GitCommands(
     }
 
 
+def LoadFetchLedger():
+    try:
+        with open(gFetchLedgerFile, "r") as ledgerFile:
+            return json.load(ledgerFile)
+    except (OSError, ValueError):
+        return {}
+
+
+def LastFetch(repoPath, remote="origin"):
+    # When git-123 last fetched the remote; falls back to FETCH_HEAD for
+    # fetches made outside the tool. None when the repo was never fetched.
+    # Once the ledger knows the repo, FETCH_HEAD is not used: pulls and
+    # prefetches write it without fetching (and pruning) all of origin.
+    fetchHead = MTime(os.path.join(GitDir(repoPath), "FETCH_HEAD"))
+    if fetchHead is None:
+        return None
+    fetches = LoadFetchLedger().get(repoPath)
+    if fetches:
+        return fetches.get(remote)
+    return fetchHead
+
+
+def RecordFetch(repoPath, remote="origin"):
+    with gFetchLedgerLock:
+        ledger = LoadFetchLedger()
+        ledger.setdefault(repoPath, {})[remote] = time.time()
+        with open(gFetchLedgerFile, "w") as ledgerFile:
+            json.dump(ledger, ledgerFile, indent=2, sort_keys=True)
+
+
+def Prefetched(repoPath, branch):
+    # True when the prefetcher fetched origin/branch within
+    # prefetchFreshnessSeconds.
+    fetched = LoadFetchLedger().get(repoPath, {}).get(f"origin/{branch}")
+    return fetched is not None and time.time() - fetched < gPrefetchFreshness
+
+
+class Prefetcher:
+    """Fetches the branches the next command is likely to need (main, devhead
+    and the upstream) in a background thread while the menus wait for input.
+
+    A git command that changes the repo cancels it first. On POSIX the fetch
+    is stopped with SIGTERM to its process group, which git handles by
+    removing its lock files. Windows has no such signal (TerminateProcess
+    would leave the lock files behind), so there the command waits for the
+    fetch to finish instead. PullBranch always waits for it and then
+    fast-forwards from the fetched refs. Fetched branches are recorded in
+    the fetch ledger as "origin/<branch>". The fetch never prompts: it runs
+    without a terminal and with GIT_TERMINAL_PROMPT=0.
+    """
+
+    def __init__(self, repoPath, branches):
+        self.repoPath = repoPath
+        self.branches = branches
+        self.proc = None
+        self.cancelled = False
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _git(self, arr):
+        with self.lock:
+            if self.cancelled:
+                return None, ""
+            start = time.perf_counter()
+            self.proc = subprocess.Popen(
+                arr,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                cwd=self.repoPath,
+                env=dict(os.environ, GIT_TERMINAL_PROMPT="0"),
+                start_new_session=True,
+            )
+        out, err = self.proc.communicate()
+        LogCommand(
+            arr,
+            self.proc.returncode,
+            self.repoPath,
+            time.perf_counter() - start,
+            len(out) + len(err),
+        )
+        return self.proc.returncode, out.decode("utf-8", errors="replace")
+
+    def _run(self):
+        # only branches origin has (as far as the last fetch knows)
+        exitcode, out = self._git(
+            ["git", "for-each-ref", "--format=%(refname:lstrip=3)"]
+            + [f"refs/remotes/origin/{b}" for b in self.branches]
+        )
+        branches = out.split() if exitcode == 0 else []
+        if not branches:
+            return
+        exitcode, out = self._git(
+            ["git", "fetch", "--quiet", "--no-write-fetch-head", "origin"] + branches
+        )
+        if exitcode == 0 and not self.cancelled:
+            for branch in branches:
+                RecordFetch(self.repoPath, f"origin/{branch}")
+
+    def running(self):
+        return self.thread.is_alive()
+
+    def cancel(self, wait=True):
+        with self.lock:
+            self.cancelled = True
+            proc = self.proc
+        if proc is not None and proc.poll() is None and hasattr(os, "killpg"):
+            try:
+                os.killpg(proc.pid, signal.SIGTERM)
+            except OSError:
+                pass  # already exited
+        if wait:
+            self.thread.join()
+
+    def wait(self):
+        self.thread.join()
+
+
+def StartPrefetch(repoPath, repoStatus):
+    # Called when Main probes the repo. Skips branches prefetched recently.
+    global gPrefetch
+    if not gPrefetchEnabled:
+        return
+    if gPrefetch is not None:
+        if gPrefetch.repoPath == repoPath and gPrefetch.running():
+            return
+        gPrefetch.cancel()
+    branches = [gMainBranch, gSelectedDevHead]
+    upstream = repoStatus.upstream
+    if upstream and upstream.startswith("origin/") and not repoStatus.gone:
+        branches.append(upstream[len("origin/") :])
+    branches = [
+        b
+        for i, b in enumerate(branches)
+        if b not in branches[:i] and not Prefetched(repoPath, b)
+    ]
+    gPrefetch = Prefetcher(repoPath, branches) if branches else None
+
+
+def CancelPrefetch(arr, cwd=None):
+    # Before a git command that changes the repo being prefetched.
+    if gPrefetch is None or arr[0] != "git" or ReadOnlyGit(arr):
+        return
+    if os.path.abspath(cwd or os.getcwd()) == gPrefetch.repoPath:
+        if gPrefetch.running() and not hasattr(os, "killpg"):
+            Print_("Waiting for prefetch...")
+        gPrefetch.cancel()
+
+
+def StopPrefetch():
+    # At exit. Where the fetch cannot be stopped cleanly it is left to
+    # finish on its own.
+    if gPrefetch is not None:
+        gPrefetch.cancel(wait=hasattr(os, "killpg"))
+
+
+def FetchOrigin(force=False, cwd=None):
+    # Fetch & prune origin unless it was fetched in the last
+    # fetchFreshnessSeconds. Returns False when the fetch was skipped.
+    repoPath = os.path.abspath(cwd or os.getcwd())
+    last = LastFetch(repoPath)
+    if not force and last and time.time() - last < gFetchFreshness:
+        if cwd is None:
+            Print_(f"Fetch skipped, origin fetched {FormatAge(last)}.")
+        return False
+    if cwd is None:
+        gitCmd["fetch"](["--prune", "origin"])
+    else:
+        RunCommand(["git", "fetch", "--prune", "origin"], cwd=cwd)
+    RecordFetch(repoPath)
+    return True
+
+
+def TrackingBranch(branch, cwd=None):
+    # Creates a local branch that only exists on origin, tracking it, as
+    # "git checkout branch" would.
+    try:
+        RunCommand(
+            ["git", "rev-parse", "--verify", "-q", f"refs/heads/{branch}"], cwd=cwd
+        )
+    except RunCommandException:
+        RunCommand(["git", "branch", "--track", branch, f"origin/{branch}"], cwd=cwd)
+
+
+def FastForwardBranch(branch, cwd=None):
+    # Fast-forwards a branch that is not checked out by ref ("fetch origin
+    # branch:branch"), without touching the working tree. Waits for a
+    # running prefetch of the repo; a branch the prefetcher fetched is
+    # fast-forwarded from origin/branch without going to the network.
+    repoPath = os.path.abspath(cwd or os.getcwd())
+    if gPrefetch is not None and gPrefetch.repoPath == repoPath:
+        if gPrefetch.running():
+            Print_("Waiting for prefetch...")
+        gPrefetch.wait()
+    TrackingBranch(branch, cwd)
+    source, refspec = "origin", f"{branch}:{branch}"
+    if Prefetched(repoPath, branch):
+        source = "."
+        refspec = f"refs/remotes/origin/{branch}:refs/heads/{branch}"
+    return RunCommand(
+        ["git", "fetch", "--no-write-fetch-head", source, refspec], cwd=cwd
+    )
+
+
+def PullBranch(branch, currentBranch):
+    # Updates a local branch from origin; returns the branch now checked out.
+    # The checked out branch is pulled. Any other branch is fast-forwarded by
+    # ref (FastForwardBranch), and is only checked out and pulled when it
+    # cannot be fast-forwarded.
+    if branch != currentBranch:
+        Print_(f"Update {branch}")
+        try:
+            exitcode, out, err = FastForwardBranch(branch)
+            Print_((out + err).strip())
+            return currentBranch
+        except RunCommandException as e:
+            Print_(e.err.strip())
+            PrintIndented(f"**   {branch} cannot be fast-forwarded, checking it out")
+            gitCmd["checkout"](branch)
+    gitCmd["pull"]()
+    return branch
+
+
 def CheckoutFetchPull(taskBranch):
-    if taskBranch != gMainBranch:
+    FetchOrigin()
+    if PullBranch(gMainBranch, taskBranch) != gMainBranch:
         gitCmd["checkout"](gMainBranch)
-    gitCmd["fetch"](["--prune", "origin"])
-    gitCmd["pull"]()
 
 
 def CheckoutDevheadPull(taskBranch, option=0, mainBranch=False):
-    if taskBranch != gSelectedDevHead:
-        gitCmd["checkout"](gSelectedDevHead)
-    gitCmd["pull"]()
-    gitCmd["checkout"](gMainBranch)
+    # Ends on gMainBranch, or back on taskBranch for the hidden options.
+    currentBranch = PullBranch(gSelectedDevHead, taskBranch)
     if mainBranch:
-        gitCmd["pull"]()
-    if option > 100:
-        gitCmd["checkout"](taskBranch)
+        currentBranch = PullBranch(gMainBranch, currentBranch)
+    endBranch = taskBranch if option > 100 else gMainBranch
+    if currentBranch != endBranch:
+        gitCmd["checkout"](endBranch)
 
 
 def GetKey(d, value):
@@ -293,22 +1690,38 @@ def Compile(repo, databaseItems):
     if not databaseItems:
         PrintIndented("**   No items to compile")
         return
+    blobs = HashFiles([d for dbFiles in databaseItems.values() for d in dbFiles])
+    changedItems = {}
     for schema, dbFiles in databaseItems.items():
         print(schema)
         for d in dbFiles:
-            print(d)
+            if IsCompiled(gDatabase, schema, d, blobs.get(d)):
+                print(f"{d} (unchanged)")
+            else:
+                print(d)
+                changedItems.setdefault(schema, []).append(d)
     Print_()
     options = [
-        "Compile All",          # 0
-        "Compile Individually", # 1
-        "Return",               # 2
+        "Compile All",            # 0
+        "Compile Individually",   # 1
+        "Compile All (Parallel)", # 2
+        "Force Compile All",      # 3
+        "Compile Cache...",       # 4
+        "Return",                 # 5
     ]
     optionInt = GetResponse(options, 2)
-    if optionInt == 0:
-        for schema, dbFiles in databaseItems.items():
-            SqlCommand(dbFiles, schema, gDatabase)
+    if optionInt in (0, 1, 2) and not changedItems:
+        PrintIndented("**   All items unchanged since last compile", 2)
+    elif optionInt in (0, 3):
+        items = changedItems if optionInt == 0 else databaseItems
+        for schema, dbFiles in items.items():
+            exitCode, fileResults, errorMessage = SqlCommand(
+                dbFiles, schema, gDatabase, failFast=gCompileFailFast
+            )
+            RecordCompiled(gDatabase, schema, fileResults, blobs)
+            PrintSqlErrors(fileResults)
     elif optionInt == 1:
-        for schema, dbFiles in databaseItems.items():
+        for schema, dbFiles in changedItems.items():
             for filePath in dbFiles:
                 options = [
                     f"Compile {filePath}", # 0
@@ -316,14 +1729,21 @@ def Compile(repo, databaseItems):
                 ]
                 optionInt = GetResponse(options, 3)
                 if optionInt == 0:
-                    SqlCommand([filePath], schema, gDatabase)
+                    output = SqlSessionCommand(filePath, schema, gDatabase)
+                    RecordCompiled(gDatabase, schema, [(filePath, output)], blobs)
+                    PrintSqlErrors([(filePath, output)], 3)
                 elif optionInt == 1:
                     pass
     elif optionInt == 2:
+        CompileParallel(changedItems, gDatabase, blobs)
+    elif optionInt == 4:
+        CompileCacheMenu(gDatabase)
+    elif optionInt == 5:
         pass
 
 
 def MergeIntoDevhead(repo, taskBranch, databaseItems=None):
+    databaseItems = databaseItems or {}
     if taskBranch == gSelectedDevHead:
         raise Exception(
             f"You cannot run this from {gSelectedDevHead}."
@@ -335,6 +1755,11 @@ def MergeIntoDevhead(repo, taskBranch, databaseItems=None):
         "Exit",         # 2
     ]
     optionInt = GetResponse(options)
+    if optionInt < 2 and gDevheadWorktree:
+        return MergeInWorktree(repo, taskBranch, databaseItems, optionInt == 1)
+    if optionInt == 1:
+        # by ref before the checkout, reusing the prefetch
+        PullBranch(gSelectedDevHead, taskBranch)
     if optionInt < 2:
         try:
             gitCmd["checkout"](gSelectedDevHead)
@@ -342,10 +1767,7 @@ def MergeIntoDevhead(repo, taskBranch, databaseItems=None):
             print(f"\n  ** Error checking out {gSelectedDevHead} **\n")
             return
 
-    if optionInt == 0:
-        gitCmd["merge"](taskBranch)
-    elif optionInt == 1:
-        gitCmd["pull"]()
+    if optionInt in (0, 1):
         gitCmd["merge"](taskBranch)
     elif optionInt == 2:
         return
@@ -382,7 +1804,7 @@ def MergeIntoDevhead(repo, taskBranch, databaseItems=None):
                     gBitBucketOrg, repo, taskBranch
                 )
                 Print_("Opening Branch...")
-                webbrowser.open(url)
+                OpenBrowser(url)
             elif optionInt == 1:
                 return
         elif optionInt == 1:
@@ -406,7 +1828,7 @@ def MergeIntoDevhead(repo, taskBranch, databaseItems=None):
                         gBitBucketOrg, repo, taskBranch
                     )
                     Print_("Opening Branch...")
-                    webbrowser.open(url)
+                    OpenBrowser(url)
                 elif optionInt == 1:
                     return
             elif optionInt == 1:
@@ -414,11 +1836,110 @@ def MergeIntoDevhead(repo, taskBranch, databaseItems=None):
         elif optionInt == 2:
             return
     elif optionInt == 1:
-        gitCmd["checkout"](taskBranch)
-    elif optionInt == 2:
-        gitCmd["merge"]("--abort")
-    elif optionInt == 3:
-        pass
+        gitCmd["checkout"](taskBranch)
+    elif optionInt == 2:
+        gitCmd["merge"]("--abort")
+    elif optionInt == 3:
+        pass
+
+
+def DevheadWorktree(repoPath, devHead):
+    # Detached worktree where devHead is merged, pushed and compiled, so the
+    # user's checkout is never switched. Created on first use, then kept.
+    # Being detached, it leaves devHead free to be checked out elsewhere.
+    # A devHead that only exists on origin gets a local tracking branch
+    # first, as "git checkout devHead" would have created.
+    worktree = os.path.join(
+        gWorktreeDir, f"{os.path.basename(repoPath)}.{devHead.replace('/', '-')}"
+    )
+    TrackingBranch(devHead, repoPath)
+    if not os.path.exists(os.path.join(worktree, ".git")):
+        RunCommand(["git", "worktree", "prune"], cwd=repoPath)
+        RunCommand(
+            ["git", "worktree", "add", "--detach", worktree, devHead], cwd=repoPath
+        )
+    return worktree
+
+
+def WorktreeMerge(repoPath, worktree, devHead, taskBranch, pull=False):
+    # Merges taskBranch into devHead in the worktree from DevheadWorktree.
+    # The local devHead branch is moved to the merge, as a merge on the
+    # checked out branch would have.
+    results = []
+    if pull:
+        results.append(UpdateBranch(devHead, repoPath))
+    results.append(RunCommand(["git", "checkout", "--detach", devHead], cwd=worktree))
+    results.append(
+        RunCommand(["git", "merge", "--no-edit", taskBranch], cwd=worktree)
+    )
+    RunCommand(["git", "update-ref", f"refs/heads/{devHead}", "HEAD"], cwd=worktree)
+    return results
+
+
+def PushWorktree(worktree, devHead):
+    command = ["git", "push", "--progress", "origin", f"HEAD:refs/heads/{devHead}"]
+    for line in StreamCommand(command, cwd=worktree):
+        Print_(line)
+
+
+def MergeInWorktree(repo, taskBranch, databaseItems, pull=False):
+    repoPath = os.path.join(gLocalReposDir, repo)
+    Print_(f"Merge {taskBranch} into {gSelectedDevHead} (worktree)")
+    try:
+        worktree = DevheadWorktree(repoPath, gSelectedDevHead)
+    except RunCommandException as e:
+        Print_((e.out + e.err).strip())
+        PrintIndented(f"**   Could not create the {gSelectedDevHead} worktree")
+        return
+    try:
+        results = WorktreeMerge(
+            repoPath, worktree, gSelectedDevHead, taskBranch, pull
+        )
+    except RunCommandException as e:
+        Print_((e.out + e.err).strip())
+        options = [
+            "Abort Merge", # 0
+            "Exit",        # 1
+        ]
+        optionInt = GetResponse(options)
+        if optionInt == 0:
+            try:
+                RunCommand(["git", "merge", "--abort"], cwd=worktree)
+            except RunCommandException:
+                pass
+        else:
+            PrintIndented(f"**   Resolve the merge in {worktree}")
+        return
+    for result in results:
+        Print_(CommandOutput(result))
+
+    options = [
+        f"Push {gSelectedDevHead}", # 0
+        "Exit",                     # 1
+    ]
+    optionInt = GetResponse(options)
+    if optionInt != 0:
+        return
+    PushWorktree(worktree, gSelectedDevHead)
+
+    options = [
+        f"Compile ({len(databaseItems)})", # 0
+        "Open in BitBucket",               # 1
+        "Exit",                            # 2
+    ]
+    optionInt = GetResponse(options)
+    if optionInt == 0:
+        os.chdir(worktree)
+        try:
+            Compile(repo, databaseItems)
+        finally:
+            os.chdir(repoPath)
+    elif optionInt == 1:
+        url = "https://bitbucket.org/{}/{}/branch/{}".format(
+            gBitBucketOrg, repo, taskBranch
+        )
+        Print_("Opening Branch...")
+        OpenBrowser(url)
 
 
 def AfterPush(repo, taskBranch, databaseItems=None):
@@ -438,25 +1959,17 @@ def AfterPush(repo, taskBranch, databaseItems=None):
                 gBitBucketOrg, repo, taskBranch
             )
             Print_("Opening Branch...")
-            webbrowser.open(url)
+            OpenBrowser(url)
         elif optionInt == 2:
-            Main(repo)
+            return "refresh"
         elif optionInt == 3:
             pass
 
-def TrackingRemote(taskBranch, indent=0):
-    exitcode, out, err = RunCommand(["git", "branch", "-vv"])
-    lines = out.splitlines()
-    remoteBranch = f"[origin/{taskBranch}"
-    remoteBranches = [
-        line.split(None, 2)[2]
-        for line in lines
-        if f"{remoteBranch}]" in line or f"{remoteBranch}:" in line
-    ]
+def TrackingRemote(repoStatus, indent=0):
     Print_()
-    for branch in remoteBranches:
-        msg = f"Remote: {branch}"
-    if not remoteBranches:
+    if repoStatus.upstream == f"origin/{repoStatus.branch}":
+        msg = f"Remote: {repoStatus.tracking()}"
+    else:
         msg = "No remote."
     PrintIndented("-" * len(msg), indent)
     PrintIndented(msg, indent)
@@ -464,7 +1977,7 @@ def TrackingRemote(taskBranch, indent=0):
 
 
 def PushOption(repo, taskBranch):
-    remote = TrackingRemote(taskBranch, 1)
+    remote = TrackingRemote(GetRepoStatus(), 1)
     options = [
         "Push",      # 0
         "Main Menu", # 1
@@ -473,9 +1986,9 @@ def PushOption(repo, taskBranch):
     optionInt = GetResponse(options)
     if optionInt == 0:
         PushToRemote(remote, taskBranch)
-        AfterPush(repo, taskBranch)
+        return AfterPush(repo, taskBranch)
     elif optionInt == 1:
-        Main(repo)
+        return "refresh"
     elif optionInt == 2:
         pass
 
@@ -488,7 +2001,15 @@ def PushToRemote(remote, taskBranch):
 
 
 def GetLocalBranches():
-    exitcode, out, err = RunCommand(["git", "branch"])
+    response = DaemonRequest("branches", cwd=os.getcwd())
+    if response is not None:
+        out = response["out"]
+    else:
+        exitcode, out, err = RunCommand(["git", "branch"])
+    return PrefixedBranches(out)
+
+
+def PrefixedBranches(out):
     lines = out.splitlines()
     localLines = [l.strip() for l in lines]
     branchesList = []
@@ -522,15 +2043,40 @@ def CommitSteps(repo, taskBranch, stepsBranch, migration, issue, x="0"):
     gitCmd["add"](addFile)
     gitCmd["commit"]("Add migration steps")
     if x == "0":
-        PushOption(repo, stepsBranch)
+        return PushOption(repo, stepsBranch)
     elif x in ("00", "10"):
-        remote = TrackingRemote(stepsBranch)
+        remote = TrackingRemote(GetRepoStatus())
         PushToRemote(remote, stepsBranch)
         url = "https://bitbucket.org/{}/{}/branch/{}".format(
             gBitBucketOrg, repo, stepsBranch
         )
         Print_("Opening Branch...")
-        webbrowser.open(url)
+        OpenBrowser(url)
+
+
+def GoneBranches(cwd=None):
+    # Local branches whose upstream no longer exists, except the checked out
+    # one, from a single for-each-ref.
+    exitcode, out, err = RunCommand(
+        [
+            "git",
+            "for-each-ref",
+            "--format=%(HEAD)%00%(refname:short)%00%(upstream:track)",
+            "refs/heads",
+        ],
+        cwd=cwd,
+    )
+    goneBranches = []
+    for line in out.splitlines():
+        head, branch, track = line.split("\0")
+        if track == "[gone]" and head != "*":
+            goneBranches.append(branch)
+    return goneBranches
+
+
+def DeleteBranches(branches, cwd=None):
+    exitcode, out, err = RunCommand(["git", "branch", "-D"] + branches, cwd=cwd)
+    return out
 
 
 def RemoteGone(taskBranch):
@@ -544,9 +2090,7 @@ def RemoteGone(taskBranch):
             CheckoutFetchPull(taskBranch)
         elif optionInt == 1:
             return
-    exitcode, out, err = RunCommand(["git", "branch", "-vv"])
-    lines = out.splitlines()
-    goneBranches = [line.split(None, 1)[0] for line in lines if ": gone]" in line]
+    goneBranches = GoneBranches()
     PrintIndented("**   Branches that no longer exist on Remote:")
     Print_()
     for branch in goneBranches:
@@ -562,10 +2106,9 @@ def RemoteGone(taskBranch):
     ]
     optionInt = GetResponse(options)
     if optionInt == 0:
-        for b in goneBranches:
-            exitcode, out, err = RunCommand(["git", "branch", "-D", b])
-            Print_(out)
+        Print_(DeleteBranches(goneBranches))
     elif optionInt == 1:
+        selected = []
         for b in goneBranches:
             options = [
                 f"Delete {b}", # 0
@@ -573,15 +2116,73 @@ def RemoteGone(taskBranch):
             ]
             optionInt = GetResponse(options)
             if optionInt == 0:
-                exitcode, out, err = RunCommand(["git", "branch", "-D", b])
-                Print_(out)
+                selected.append(b)
             elif optionInt == 1:
                 pass
+        if selected:
+            Print_(DeleteBranches(selected))
     elif optionInt == 2:
         pass
 
 
-def HeaderFooter(repo, taskBranch):
+def RemoteGoneSweep(dirs):
+    # Remote Gone for every repository: one combined table, then a single
+    # batched "git branch -D" per repository.
+    def sweep(repo):
+        try:
+            return GoneBranches(os.path.join(gLocalReposDir, repo))
+        except RunCommandException:
+            return []
+
+    with ThreadPoolExecutor(max_workers=gMaxWorkers) as executor:
+        goneByRepo = {
+            repo: branches
+            for repo, branches in zip(dirs, executor.map(sweep, dirs))
+            if branches
+        }
+    Print_()
+    if not goneByRepo:
+        PrintIndented("**   No branches to delete")
+        return
+    PrintIndented("**   Branches that no longer exist on Remote:")
+    PrintTable(
+        ["Repository", "Branch"],
+        [[repo, b] for repo, branches in goneByRepo.items() for b in branches],
+    )
+    Print_()
+    options = [
+        "Delete All",           # 0
+        "Delete by Repository", # 1
+        "Exit",                 # 2
+    ]
+    optionInt = GetResponse(options)
+    if optionInt == 1:
+        for repo, branches in list(goneByRepo.items()):
+            options = [
+                f"Delete {len(branches)} in {repo}", # 0
+                "Skip",                              # 1
+            ]
+            if GetResponse(options, 2) != 0:
+                del goneByRepo[repo]
+    elif optionInt != 0:
+        return
+
+    def delete(repo):
+        try:
+            return DeleteBranches(
+                goneByRepo[repo], os.path.join(gLocalReposDir, repo)
+            )
+        except RunCommandException as e:
+            return e.err
+
+    with ThreadPoolExecutor(max_workers=gMaxWorkers) as executor:
+        for repo, out in zip(goneByRepo, executor.map(delete, goneByRepo)):
+            PrintIndented(f"** {repo}")
+            PrintIndented(out, 2)
+
+
+def HeaderFooter(repo, repoStatus):
+    taskBranch = repoStatus.branch
     lenRepo = len(repo)
     lenBranch = len(taskBranch)
     lenMain = len(gMainBranch)
@@ -601,23 +2202,32 @@ def HeaderFooter(repo, taskBranch):
 
 
 def Main(repo, optionOne=None, optionTwo=None):
+    # Returns the next screen for Navigate() instead of calling itself.
+    global gRepoStatus
     repoPath = os.path.join(gLocalReposDir, repo)
-    exitcode, out, err = RunCommand(["git", "symbolic-ref", "--short", "HEAD"])
-    taskBranch = out.strip()
-    HeaderFooter(repo, taskBranch)
-    exitcode, out, err = RunCommand(["git", "status"])
-    Print_(out)
-
-    lines = out.splitlines()
-    pattern = re.compile(r"database\/(\w+)\/\S+\.sql$")
-    databaseItems = {}
-    for line in lines:
-        match = pattern.search(line)
-        if match:
-            schema = match.group(1)
-            if schema not in databaseItems:
-                databaseItems[schema] = []
-            databaseItems[schema].append(match.group(0))
+    if gRepoStatus is None:
+        gRepoStatus = ProbeRepo(gMainBranch)
+        StartPrefetch(os.path.abspath(os.getcwd()), gRepoStatus)
+    repoStatus = gRepoStatus
+    taskBranch = repoStatus.branch
+    HeaderFooter(repo, repoStatus)
+    PrintIndented("\n".join(repoStatus.lines()), 0)
+    Print_()
+    databaseItems = {
+        schema: dbFiles[:] for schema, dbFiles in repoStatus.changeSet.items()
+    }
+    DatabaseItems(
+        [d for dbFiles in repoStatus.databaseItems.values() for d in dbFiles],
+        databaseItems,
+    )
+    if repoStatus.changeSet:
+        numFiles = sum(len(dbFiles) for dbFiles in repoStatus.changeSet.values())
+        PrintIndented(
+            f"SQL changed on branch: {numFiles} file(s) in "
+            + ", ".join(repoStatus.changeSet),
+            0,
+        )
+        Print_()
 
     if optionOne is not None:
         optionInt = optionOne
@@ -637,7 +2247,7 @@ def Main(repo, optionOne=None, optionTwo=None):
         optionInt = GetResponse(options)
 
     if optionInt == 0:
-        remote = TrackingRemote(taskBranch, 2)
+        remote = TrackingRemote(repoStatus, 2)
         if optionTwo is not None:
             optionInt = optionTwo
         else:
@@ -653,18 +2263,18 @@ def Main(repo, optionOne=None, optionTwo=None):
         if optionInt == 0:
             if gitCmd["commitAll"]():
                 PushToRemote(remote, taskBranch)
-                AfterPush(repo, taskBranch, databaseItems)
+                return AfterPush(repo, taskBranch, databaseItems)
         elif optionInt == 2:
             gitCmd["addAll"]()
         if optionInt in (1, 2):
             if gitCmd["commit"]():
                 PushToRemote(remote, taskBranch)
-                AfterPush(repo, taskBranch, databaseItems)
+                return AfterPush(repo, taskBranch, databaseItems)
         elif optionInt == 3:
             if gitCmd["commit"]():
-                PushOption(repo, taskBranch)
+                return PushOption(repo, taskBranch)
         elif optionInt == 4:
-            Main(repo)
+            return "menu"
         elif optionInt == 5:
             pass
     elif optionInt == 1:
@@ -677,12 +2287,11 @@ def Main(repo, optionOne=None, optionTwo=None):
             "Main Menu",                    # 5
         ]
         optionInt = GetResponse(options, 2)
-        if optionInt in (0, 1):
-            branchesList = GetLocalBranches()
         if optionInt == 0:
+            branchesList = GetLocalBranches()
             if len(branchesList) > 0:
-                optionInt = GetResponse(branchesList, 3)
-                if optionInt == 1000:
+                optionInt = FilterMenu(branchesList, 3)
+                if optionInt is None:
                     return
                 try:
                     gitCmd["checkout"](branchesList[optionInt])
@@ -694,10 +2303,29 @@ def Main(repo, optionOne=None, optionTwo=None):
                     "** No prefixed branches available to checkout. **\n", level=3
                 )
                 Print_("\n")
-            Main(repo)
+            return "refresh"
         elif optionInt == 1:
-            gitCmd["fetch"](["--prune", "origin"])
-            exitcode, out, err = RunCommand(["git", "branch", "-r"])
+            FetchOrigin()
+            localBranches, remoteBranches = RunProbes(
+                [
+                    (["git", "branch"], None),
+                    (
+                        [
+                            "git",
+                            "for-each-ref",
+                            "--sort=-committerdate",
+                            "--format=%(refname:short)",
+                            "refs/remotes/origin",
+                        ],
+                        None,
+                    ),
+                ]
+            )
+            for result in (localBranches, remoteBranches):
+                if isinstance(result, RunCommandException):
+                    raise result
+            branchesList = PrefixedBranches(localBranches[1])
+            exitcode, out, err = remoteBranches
             lines = out.splitlines()
             remoteLines = [l.strip() for l in lines]
             RemoteBranchesList = []
@@ -705,13 +2333,15 @@ def Main(repo, optionOne=None, optionTwo=None):
                 if taskBranch.find(p) == 0:
                     branchesList.append(taskBranch)
                     break
-            for p in gBranchPrefixes:
-                for l in remoteLines:
+            # most recent commit first, whatever the prefix
+            for l in remoteLines:
+                for p in gBranchPrefixes:
                     if l.find(f"origin/{p}") == 0 and l[7:] not in branchesList:
                         RemoteBranchesList.append(l)
+                        break
             if len(RemoteBranchesList) > 0:
-                optionInt = GetResponse(RemoteBranchesList, 3)
-                if optionInt == 1000:
+                optionInt = FilterMenu(RemoteBranchesList, 3)
+                if optionInt is None:
                     return
                 try:
                     exitcode, out, err = RunCommand(
@@ -732,20 +2362,20 @@ def Main(repo, optionOne=None, optionTwo=None):
                     "** No prefixed branches available to checkout. **\n", level=3
                 )
                 Print_("\n")
-            Main(repo)
+            return "refresh"
         elif optionInt == 2:
             gitCmd["checkout"](gSelectedDevHead)
-            Main(repo)
+            return "refresh"
         elif optionInt == 3:
             gitCmd["checkout"](gMainBranch)
-            Main(repo)
+            return "refresh"
         elif optionInt == 4:
             gitCmd["checkout"](gMainProdBranch)
-            Main(repo)
+            return "refresh"
         elif optionInt == 5:
-            Main(repo)
+            return "menu"
     elif optionInt == 2:
-        remote = TrackingRemote(taskBranch, 2)
+        remote = TrackingRemote(repoStatus, 2)
         options = [
             f"Fetch, Prune & Pull (must be on {gMainBranch})", # 0
             "Fetch & Prune Origin",                            # 1
@@ -764,33 +2394,32 @@ def Main(repo, optionOne=None, optionTwo=None):
                     f"You must start from branch: {gMainBranch} or {gMainProdBranch}"
                 )
                 return
-            gitCmd["fetch"](["--prune", "origin"])
+            FetchOrigin()
             gitCmd["pull"]()
-            Main(repo)
+            return "refresh"
         elif optionInt == 1:
-            gitCmd["fetch"](["--prune", "origin"])
-            Main(repo)
+            FetchOrigin(force=True)
+            return "refresh"
         elif optionInt == 2:
             gitCmd["pull"]()
-            Main(repo)
+            return "refresh"
         elif optionInt in (3, 303):
             CheckoutDevheadPull(taskBranch, optionInt)
-            Main(repo)
+            return "refresh"
         elif optionInt in (4, 404):
             CheckoutDevheadPull(taskBranch, optionInt, True)
-            Main(repo)
+            return "refresh"
         elif optionInt in (5, 505):
-            if taskBranch != gMainBranch:
-                gitCmd["checkout"](gMainBranch)
-            gitCmd["pull"]()
-            if optionInt > 100:
-                gitCmd["checkout"](taskBranch)
-            Main(repo)
+            currentBranch = PullBranch(gMainBranch, taskBranch)
+            endBranch = taskBranch if optionInt > 100 else gMainBranch
+            if currentBranch != endBranch:
+                gitCmd["checkout"](endBranch)
+            return "refresh"
         elif optionInt == 6:
             PushToRemote(remote, taskBranch)
-            Main(repo)
+            return "refresh"
         elif optionInt == 7:
-            Main(repo)
+            return "menu"
         elif optionInt == 8:
             pass
 
@@ -834,11 +2463,13 @@ def Main(repo, optionOne=None, optionTwo=None):
             os.system(c)
             x = input(" Modify file as needed. Press 0 [10,00] to continue...")
             if x in ("0", "00", "10"):
-                CommitSteps(repo, taskBranch, stepsBranch, gSelectedMigration, issue, x)
+                return CommitSteps(
+                    repo, taskBranch, stepsBranch, gSelectedMigration, issue, x
+                )
         elif optionInt == 1:
-            CommitSteps(repo, taskBranch, stepsBranch, gSelectedMigration, issue)
+            return CommitSteps(repo, taskBranch, stepsBranch, gSelectedMigration, issue)
         elif optionInt == 2:
-            Main(repo)
+            return "menu"
         elif optionInt == 3:
             pass
     elif optionInt == 4:
@@ -854,51 +2485,683 @@ def Main(repo, optionOne=None, optionTwo=None):
                     f"You cannot run this from {gMainBranch}."
                     " Checkout your task branch first!"
                 )
-            gitCmd["checkout"](gMainBranch)
-            gitCmd["pull"]()
-            gitCmd["checkout"](taskBranch)
+            if PullBranch(gMainBranch, taskBranch) != taskBranch:
+                gitCmd["checkout"](taskBranch)
             gitCmd["merge"](gMainBranch)
-            PushOption(repo, taskBranch)
+            return PushOption(repo, taskBranch)
         elif optionInt == 1:
             MergeIntoDevhead(repo, taskBranch, databaseItems)
         elif optionInt == 2:
-            Main(repo)
+            return "menu"
     elif optionInt == 5:
-        if taskBranch != gMainBranch:
-            gitCmd["checkout"](gMainBranch)
-        gitCmd["pull"]()
+        PullBranch(gMainBranch, taskBranch)
         newBranch = input(" New Branch: ")
-        gitCmd["checkout"](["-b", newBranch])
-        Main(repo)
+        gitCmd["checkout"](["-b", newBranch, gMainBranch])
+        return "refresh"
     elif optionInt == 6:
         url = "https://bitbucket.org/{}/{}/branch/{}".format(
             gBitBucketOrg, repo, taskBranch
         )
         Print_("Opening Branch...")
-        webbrowser.open(url)
+        OpenBrowser(url)
     elif optionInt == 7:
         RemoteGone(taskBranch)
-        Main(repo)
+        return "refresh"
     elif optionInt == 8:
-        SelectRepo(False)
+        return "repos"
     elif optionInt == 9:
         pass
     # hidden options
     elif optionInt == 100:
         CheckoutFetchPull(taskBranch)
-        Main(repo)
+        return "refresh"
     elif optionInt == 105:
-        CheckoutFetchPull(taskBranch)
+        FetchOrigin()
+        PullBranch(gMainBranch, taskBranch)
         newBranch = input(" New Branch: ")
-        gitCmd["checkout"](["-b", newBranch])
-        Main(repo)
+        gitCmd["checkout"](["-b", newBranch, gMainBranch])
+        return "refresh"
     elif optionInt == 107:
         CheckoutFetchPull(taskBranch)
         RemoteGone(gMainBranch)
-        Main(repo)
+        return "refresh"
+    elif optionInt == 606:
+        return FastStatusMenu(repo)
+
+
+def ListRepos():
+    with os.scandir(gLocalReposDir) as mydir:
+        dirs = sorted(
+            list(set([i.name for i in mydir if i.is_dir()]) - set(gExcludeReposList))
+        )
+    return dirs
+
+
+def GetRepoSettings(repo):
+    settings = {
+        "database": GetKey(gDatabases, repo),
+        "mainBranch": gSpecificMainDev.get(repo, gMainDevBranch),
+        "devHead": gSpecificDevHead.get(repo, gDevHeadBranch),
+        "migration": gSpecificMigration.get(repo, gMigrationFolder),
+    }
+    return settings
+
+
+def SyncRepo(repo, force=False):
+    # Fetch & prune origin, then fast-forward the repo's main branch without
+    # touching the working tree unless the main branch is checked out.
+    repoPath = os.path.join(gLocalReposDir, repo)
+    mainBranch = GetRepoSettings(repo)["mainBranch"]
+    result = {
+        "repo": repo,
+        "mainBranch": mainBranch,
+        "fetch": None,
+        "pull": None,
+        "total": None,
+        "status": "",
+    }
+    start = time.perf_counter()
+    try:
+        fetched = FetchOrigin(force, repoPath)
+        result["fetch"] = time.perf_counter() - start if fetched else "fresh"
+
+        pullStart = time.perf_counter()
+        exitcode, out, err = RunCommand(
+            ["git", "for-each-ref", "--format=%(HEAD)", f"refs/heads/{mainBranch}"],
+            cwd=repoPath,
+        )
+        head = out.strip()
+        if not out:
+            result["status"] = f"No local {mainBranch}"
+        elif head == "*":
+            exitcode, out, err = RunCommand(
+                ["git", "merge", "--ff-only", f"origin/{mainBranch}"], cwd=repoPath
+            )
+            result["status"] = (
+                "Up to date" if "Already up to date" in out else "Updated"
+            )
+        else:
+            exitcode, out, err = RunCommand(
+                ["git", "fetch", ".", f"origin/{mainBranch}:{mainBranch}"],
+                cwd=repoPath,
+            )
+            result["status"] = "Updated" if "->" in err else "Up to date"
+        result["pull"] = time.perf_counter() - pullStart
+    except RunCommandException as e:
+        message = (e.err or e.out).strip().splitlines()
+        result["status"] = "Failed: " + (message[-1] if message else str(e.exitcode))
+    result["total"] = time.perf_counter() - start
+    return result
+
+
+def SyncAll(dirs, force=False):
+    Print_()
+    PrintIndented(f"**   Syncing {len(dirs)} repositories ({gMaxWorkers} at a time)")
+    Print_()
+    results = []
+    with ThreadPoolExecutor(max_workers=gMaxWorkers) as executor:
+        futures = [executor.submit(SyncRepo, repo, force) for repo in dirs]
+        for number, future in enumerate(as_completed(futures), 1):
+            result = future.result()
+            results.append(result)
+            PrintIndented(
+                f"[{number}/{len(dirs)}] {result['repo']}: {result['status']}"
+            )
+
+    def seconds(value):
+        if value is None or isinstance(value, str):
+            return value or "-"
+        return f"{value:.1f}s"
+
+    Print_()
+    PrintTable(
+        ["Repository", "Main", "Fetch", "Pull", "Total", "Result"],
+        [
+            [
+                r["repo"],
+                r["mainBranch"],
+                seconds(r["fetch"]),
+                seconds(r["pull"]),
+                seconds(r["total"]),
+                r["status"],
+            ]
+            for r in sorted(results, key=lambda r: r["repo"])
+        ],
+    )
+    Print_()
+
+
+def GitDir(repoPath):
+    gitDir = os.path.join(repoPath, ".git")
+    if os.path.isfile(gitDir):
+        # worktrees and submodules point to the real git dir
+        with open(gitDir, "r") as gitFile:
+            line = gitFile.readline().strip()
+        if line.startswith("gitdir:"):
+            gitDir = os.path.join(repoPath, line[7:].strip())
+    return gitDir
+
+
+def MTime(path):
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+
+def RepoStamp(repoPath, entry=None):
+    # mtimes that change whenever the indexed state of a repo can change
+    gitDir = GitDir(repoPath)
+    paths = ["HEAD", "index", "FETCH_HEAD", "packed-refs"]
+    if entry and entry.get("branch"):
+        paths.append(f"refs/heads/{entry['branch']}")
+    if entry and entry.get("upstream"):
+        paths.append(f"refs/remotes/{entry['upstream']}")
+    return [MTime(os.path.join(gitDir, path)) for path in paths]
+
+
+def IndexRepo(repo, repoStatus=None):
+    repoPath = os.path.join(gLocalReposDir, repo)
+    try:
+        repoStatus = repoStatus or GetRepoStatus(repoPath, optionalLocks=False)
+    except (RunCommandException, OSError) as e:
+        return {
+            "error": str(getattr(e, "err", e)).strip(),
+            "stamp": RepoStamp(repoPath),
+        }
+    entry = {
+        "branch": repoStatus.branch,
+        "upstream": repoStatus.upstream,
+        "ahead": repoStatus.ahead,
+        "behind": repoStatus.behind,
+        "gone": repoStatus.gone,
+        "dirty": any(xy not in ("??", "!!") for xy, p, o in repoStatus.entries),
+        "lastFetch": MTime(os.path.join(GitDir(repoPath), "FETCH_HEAD")),
+    }
+    entry["stamp"] = RepoStamp(repoPath, entry)
+    return entry
+
+
+def RefreshRepoIndex(dirs):
+    # Re-probes only the repos whose stamp changed, in parallel.
+    response = DaemonRequest("index", repos=dirs)
+    if response is not None:
+        return response["index"]
+    try:
+        with open(gRepoIndexFile, "r") as indexFile:
+            repoIndex = json.load(indexFile)
+    except (OSError, ValueError):
+        repoIndex = {}
+    stale = [
+        repo
+        for repo in dirs
+        if repo not in repoIndex
+        or repoIndex[repo].get("stamp")
+        != RepoStamp(os.path.join(gLocalReposDir, repo), repoIndex[repo])
+    ]
+    if stale:
+        with ThreadPoolExecutor(max_workers=gMaxWorkers) as executor:
+            for repo, entry in zip(stale, executor.map(IndexRepo, stale)):
+                repoIndex[repo] = entry
+        repoIndex = {repo: repoIndex[repo] for repo in dirs}
+        with open(gRepoIndexFile, "w") as indexFile:
+            json.dump(repoIndex, indexFile, indent=2, sort_keys=True)
+    return repoIndex
+
+
+def ReadOnlyGit(arr):
+    # git commands that never change the repository
+    operation = OperationType(arr)
+    if operation == "branch":
+        listing = ("-a", "-r", "-v", "-vv", "--list", "--show-current")
+        args = arr[arr.index("branch") + 1 :]
+        return all(a in listing or a.startswith("--format") for a in args)
+    return operation in (
+        "cat-file",
+        "diff",
+        "for-each-ref",
+        "log",
+        "ls-files",
+        "ls-remote",
+        "merge-base",
+        "rev-list",
+        "rev-parse",
+        "show",
+        "status",
+        "symbolic-ref",
+    )
+
+
+def DaemonGit(arr):
+    # Commands the daemon runs for a client: git only, and without the
+    # options that make git run another program or take config from the
+    # command line. Anything else is refused and the client runs it itself.
+    if not arr or arr[0] != "git":
+        return False
+    unsafe = ("-c", "--config-env", "--exec-path", "--upload-pack", "--receive-pack")
+    return not any(arg.split("=")[0] in unsafe for arg in arr[1:])
+
+
+class RepoDaemon:
+    """Keeps the index, status and local branches of every managed repo warm
+    and serves them on a Unix socket, one JSON request and response per line:
+
+        {"op": "index", "repos": [...]}    -> {"index": {repo: entry}}
+        {"op": "status", "cwd": repoPath}  -> {"out": porcelain v2 status}
+        {"op": "branches", "cwd": repoPath} -> {"out": git branch}
+        {"op": "run", "args": [...], "input": text, "cwd": path}
+                                           -> {"exitcode", "out", "err"}
+        {"op": "invalidate", "cwd": path}, {"op": "ping"}, {"op": "stop"}
+
+    Commands of one repo run one at a time and the repo is probed again after
+    each mutating command. Repos whose stamp changed, and repos a client
+    looked at in the last activeSeconds, are probed again every poll. The
+    stamp misses working tree edits, so the first status or branches request
+    for a repo that is not active probes it again before answering.
+    """
+
+    activeSeconds = 600
+
+    def __init__(self, socketPath, pollSeconds):
+        self.socketPath = socketPath
+        self.pollSeconds = pollSeconds
+        self.lock = threading.Lock()
+        self.repoLocks = {}
+        self.state = {}
+        self.active = {}
+        self.stopping = threading.Event()
+
+    def repoLock(self, repo):
+        with self.lock:
+            return self.repoLocks.setdefault(repo, threading.RLock())
+
+    def repoOf(self, cwd):
+        rel = os.path.relpath(cwd, gLocalReposDir)
+        repo = rel.split(os.sep)[0]
+        if rel == "." or repo == ".." or repo not in ListRepos():
+            raise ValueError(f"{cwd} is not a managed repository")
+        return repo, rel == repo
+
+    def refresh(self, repo):
+        repoPath = os.path.join(gLocalReposDir, repo)
+        with self.repoLock(repo):
+            try:
+                exitcode, status, err = RunCommand(
+                    ["git", "--no-optional-locks", "status"]
+                    + ["--porcelain=v2", "--branch", "-z"],
+                    cwd=repoPath,
+                )
+                exitcode, branches, err = RunCommand(["git", "branch"], cwd=repoPath)
+                state = {
+                    "status": status,
+                    "branches": branches,
+                    "entry": IndexRepo(repo, RepoStatus(status)),
+                }
+            except (RunCommandException, OSError):
+                state = {"entry": IndexRepo(repo)}
+            with self.lock:
+                self.state[repo] = state
+        return state
+
+    def cached(self, repo):
+        with self.lock:
+            state = self.state.get(repo)
+        return state or self.refresh(repo)
+
+    def poll(self):
+        while not self.stopping.wait(self.pollSeconds):
+            now = time.time()
+            stale = []
+            for repo in ListRepos():
+                with self.lock:
+                    state = self.state.get(repo)
+                    active = now - self.active.get(repo, 0) < self.activeSeconds
+                if (
+                    active
+                    or state is None
+                    or state["entry"].get("stamp")
+                    != RepoStamp(os.path.join(gLocalReposDir, repo), state["entry"])
+                ):
+                    stale.append(repo)
+            with ThreadPoolExecutor(max_workers=gMaxWorkers) as executor:
+                list(executor.map(self.refresh, stale))
+
+    def handle(self, request):
+        op = request["op"]
+        if op == "ping":
+            return {"pid": os.getpid()}
+        if op == "stop":
+            self.stopping.set()
+            return {}
+        if op == "index":
+            return {"index": {r: self.cached(r)["entry"] for r in request["repos"]}}
+        repo, atRoot = self.repoOf(request["cwd"])
+        if op in ("status", "branches"):
+            if not atRoot:
+                raise ValueError(f"{request['cwd']} is not a repository root")
+            now = time.time()
+            with self.lock:
+                active = now - self.active.get(repo, 0) < self.activeSeconds
+                self.active[repo] = now
+            # working tree edits change no stamped mtime: a repo nobody was
+            # looking at is probed now, an active one is kept by poll()
+            state = self.cached(repo) if active else self.refresh(repo)
+            if op not in state:
+                raise ValueError(state["entry"].get("error", "no state"))
+            return {"out": state[op]}
+        if op == "invalidate":
+            self.refresh(repo)
+            return {}
+        if op == "run":
+            if not DaemonGit(request["args"]):
+                raise ValueError("Only git commands are run by the daemon")
+            with self.repoLock(repo):
+                try:
+                    exitcode, out, err = RunCommand(
+                        request["args"], request.get("input"), request["cwd"]
+                    )
+                except RunCommandException as e:
+                    exitcode, out, err = e.exitcode, e.out, e.err
+                if not ReadOnlyGit(request["args"]):
+                    self.refresh(repo)
+            return {"exitcode": exitcode, "out": out, "err": err}
+        raise ValueError(f"Unknown request: {op}")
+
+    def client(self, conn):
+        with conn, conn.makefile("rwb") as stream:
+            for line in stream:
+                try:
+                    response = dict(ok=True, **self.handle(json.loads(line)))
+                except (KeyError, ValueError, OSError) as e:
+                    response = {"ok": False, "error": str(e)}
+                stream.write(json.dumps(response).encode("utf-8") + b"\n")
+                stream.flush()
+
+    def serve(self):
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        # only this user may connect
+        oldMask = os.umask(0o077)
+        try:
+            server.bind(self.socketPath)
+        finally:
+            os.umask(oldMask)
+        server.listen()
+        server.settimeout(self.pollSeconds)
+        threading.Thread(target=self.poll, daemon=True).start()
+        try:
+            while not self.stopping.is_set():
+                try:
+                    conn, address = server.accept()
+                except socket.timeout:
+                    continue
+                conn.settimeout(None)
+                threading.Thread(target=self.client, args=(conn,), daemon=True).start()
+        finally:
+            server.close()
+            os.remove(self.socketPath)
+
+
+def RunDaemon():
+    global gCommandStats
+    if not hasattr(socket, "AF_UNIX"):
+        Print_("The daemon needs Unix domain sockets, not available here.")
+        return 1
+    if os.path.exists(gDaemonSocketPath):
+        if ConnectDaemon():
+            Print_(f"A daemon is already serving {gDaemonSocketPath}")
+            return 1
+        os.remove(gDaemonSocketPath)
+    # the timing report is never printed; keep only recent commands
+    gCommandStats = deque(maxlen=1000)
+    daemon = RepoDaemon(gDaemonSocketPath, gDaemonPollSeconds)
+    dirs = ListRepos()
+    with ThreadPoolExecutor(max_workers=gMaxWorkers) as executor:
+        list(executor.map(daemon.refresh, dirs))
+    Print_(f"git-123 daemon: {len(dirs)} repositories, serving {gDaemonSocketPath}")
+    daemon.serve()
+    return 0
+
+
+def ConnectDaemon():
+    # Menus read repository state from a running daemon and send it the git
+    # commands; without one, git is probed directly as before.
+    global gDaemonSocket
+    if hasattr(socket, "AF_UNIX") and os.path.exists(gDaemonSocketPath):
+        gDaemonSocket = gDaemonSocketPath
+        return DaemonRequest("ping") is not None
+    return False
+
+
+def DaemonRequest(op, **fields):
+    # One JSON line each way, over one connection per thread. None when no
+    # daemon answers, or it cannot serve the request: the caller then runs
+    # git itself.
+    global gDaemonSocket
+    if not gDaemonSocket:
+        return None
+    try:
+        stream = getattr(gDaemonLocal, "stream", None)
+        if stream is None:
+            conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            conn.connect(gDaemonSocket)
+            stream = gDaemonLocal.stream = conn.makefile("rwb")
+            conn.close()
+        stream.write(json.dumps(dict(op=op, **fields)).encode("utf-8") + b"\n")
+        stream.flush()
+        line = stream.readline()
+        if not line:
+            raise OSError("daemon closed the connection")
+    except OSError:
+        gDaemonSocket = None
+        return None
+    response = json.loads(line)
+    return response if response.pop("ok") else None
+
+
+def LoadMaintenanceLedger():
+    try:
+        with open(gMaintenanceLedgerFile, "r") as ledgerFile:
+            return json.load(ledgerFile)
+    except (OSError, ValueError):
+        return {}
+
+
+def DueRepos(dirs):
+    # Repos not maintained in the last maintenanceDays.
+    ledger = LoadMaintenanceLedger()
+    due = time.time() - gMaintenanceDays * 86400
+    return [
+        repo
+        for repo in dirs
+        if ledger.get(os.path.join(gLocalReposDir, repo), {}).get("maintained", 0)
+        < due
+    ]
+
+
+def MaintenanceCommand(arr, cwd):
+    # Runs at the lowest CPU priority where "nice" exists.
+    start = time.perf_counter()
+    command = (["nice", "-n", "19"] if shutil.which("nice") else []) + arr
+    proc = subprocess.Popen(
+        command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, cwd=cwd
+    )
+    out, err = proc.communicate()
+    LogCommand(arr, proc.returncode, cwd, time.perf_counter() - start, len(out + err))
+    if proc.returncode != 0:
+        raise RunCommandException(
+            proc.returncode,
+            out.decode("utf-8", errors="replace"),
+            err.decode("utf-8", errors="replace"),
+        )
+
+
+def ProbeSeconds(repoPath, rounds=3):
+    # The standard probe: what a Main screen and a branch list cost.
+    times = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        RunCommand(
+            ["git", "--no-optional-locks", "status", "--porcelain=v2", "--branch"],
+            cwd=repoPath,
+        )
+        RunCommand(["git", "branch", "-vv"], cwd=repoPath)
+        times.append(time.perf_counter() - start)
+    return round(sorted(times)[len(times) // 2], 4)
+
+
+def MaintainRepo(repo, keepGoing=None):
+    # Runs the maintenance tasks and records the repo in the ledger, with the
+    # probe time before and after. Stops between tasks, without recording,
+    # when keepGoing() turns false. Errors (i.e. a directory that is not a
+    # git repository) are returned in result["error"], not raised.
+    repoPath = os.path.join(gLocalReposDir, repo)
+    start = time.perf_counter()
+    result = {"repo": repo, "tasks": {}}
+    step = "probe"
+    try:
+        result["before"] = ProbeSeconds(repoPath)
+        for step, command in gMaintenanceTasks:
+            if keepGoing and not keepGoing():
+                result["stopped"] = True
+                return result
+            taskStart = time.perf_counter()
+            MaintenanceCommand(command, repoPath)
+            result["tasks"][step] = round(time.perf_counter() - taskStart, 3)
+        step = "probe"
+        result["after"] = ProbeSeconds(repoPath)
+    except RunCommandException as e:
+        message = (e.err or e.out).strip().splitlines()
+        result["error"] = f"{step}: {message[0] if message else e.exitcode}"
+        return result
+    except OSError as e:
+        result["error"] = f"{step}: {e}"
+        return result
+    result["seconds"] = round(time.perf_counter() - start, 3)
+    result["maintained"] = time.time()
+    with gMaintenanceLedgerLock:
+        ledger = LoadMaintenanceLedger()
+        ledger[repoPath] = {k: v for k, v in result.items() if k != "repo"}
+        with open(gMaintenanceLedgerFile, "w") as ledgerFile:
+            json.dump(ledger, ledgerFile, indent=2, sort_keys=True)
+    return result
+
+
+def IdleMaintenance():
+    # Background thread: while a menu has waited for maintenanceIdleSeconds,
+    # maintains the due repos one at a time, except the one in use. A repo
+    # that fails is not tried again in this session.
+    def idle():
+        return (
+            gIdleSince is not None
+            and time.time() - gIdleSince >= gMaintenanceIdleSeconds
+        )
+
+    failed = set()
+    while True:
+        time.sleep(5)
+        if not idle():
+            continue
+        current = os.path.abspath(os.getcwd())
+        due = [
+            repo
+            for repo in DueRepos(ListRepos())
+            if os.path.join(gLocalReposDir, repo) != current and repo not in failed
+        ]
+        if not due:
+            continue
+        try:
+            result = MaintainRepo(due[0], idle)
+        except OSError:  # the ledger could not be written
+            result = {"error": True}
+        if "error" in result:
+            failed.add(due[0])
+
+
+def PrintMaintenance(results):
+    def ms(seconds):
+        return "-" if seconds is None else f"{seconds * 1000:.0f} ms"
+
+    rows = []
+    for result in results:
+        before = result.get("before")
+        after = result.get("after")
+        saved = "-"
+        if before and after is not None:
+            saved = f"{(before - after) / before * 100:.0f}%"
+        rows.append(
+            [
+                result["repo"],
+                FormatAge(result.get("maintained")),
+                ms(before),
+                ms(after),
+                saved,
+                result.get("error", ""),
+            ]
+        )
+    PrintTable(["Repository", "Maintained", "Before", "After", "Saved", "Error"], rows)
+
+
+def MaintenanceMenu(dirs):
+    ledger = LoadMaintenanceLedger()
+    Print_()
+    PrintIndented("**   Repository maintenance (probe: status + branch -vv):")
+    PrintMaintenance(
+        [
+            dict(ledger.get(os.path.join(gLocalReposDir, repo), {}), repo=repo)
+            for repo in dirs
+        ]
+    )
+    due = DueRepos(dirs)
+    options = [
+        f"Maintain Due ({len(due)})", # 0
+        "Maintain All",               # 1
+        "Exit",                       # 2
+    ]
+    optionInt = GetResponse(options)
+    if optionInt not in (0, 1):
+        return
+    repos = due if optionInt == 0 else dirs
+    PrintIndented(f"**   Maintaining {len(repos)} repositories...")
+    with ThreadPoolExecutor(max_workers=gMaintenanceWorkers) as executor:
+        results = list(executor.map(MaintainRepo, repos))
+    PrintMaintenance(results)
+
+
+def FormatAge(timestamp):
+    if not timestamp:
+        return "never"
+    seconds = max(0, time.time() - timestamp)
+    for unit, size in (("d", 86400), ("h", 3600), ("m", 60)):
+        if seconds >= size:
+            return f"{int(seconds // size)}{unit} ago"
+    return "just now"
+
+
+def RepoDashboard(dirs):
+    # Option labels for the Repository select: branch, dirty flag,
+    # ahead/behind and last fetch of every repo.
+    repoIndex = RefreshRepoIndex(dirs)
+    width = max(len(repo) for repo in dirs)
+    branchWidth = max(len(repoIndex[repo].get("branch", "")) for repo in dirs)
+    labels = []
+    for repo in dirs:
+        entry = repoIndex[repo]
+        if "error" in entry:
+            labels.append(f"{repo.ljust(width)}  (not a git repository)")
+            continue
+        label = f"{repo.ljust(width)}  {entry['branch'].ljust(branchWidth)}"
+        label += " *" if entry["dirty"] else "  "
+        if entry["gone"]:
+            label += " [gone]"
+        elif entry["ahead"] or entry["behind"]:
+            label += f" [+{entry['ahead']} -{entry['behind']}]"
+        label += f" (fetched {FormatAge(entry['lastFetch'])})"
+        labels.append(label)
+    return labels
 
 
 def SelectRepo(useDefault=True):
+    # Returns (repo, optionOne, optionTwo), or None to exit.
     global gRepo
     global gMainBranch
     global gSelectedDevHead
@@ -906,14 +3169,23 @@ def SelectRepo(useDefault=True):
     global gDatabase
     optionOne = None
     optionTwo = None
-    with os.scandir(gLocalReposDir) as mydir:
-        dirs = sorted(
-            list(set([i.name for i in mydir if i.is_dir()]) - set(gExcludeReposList))
-        )
+    dirs = ListRepos()
     if gDefaultRepo and useDefault and gDefaultRepo in dirs:
         repo = gRepo = gDefaultRepo
     else:
-        optionInt = GetResponse(dirs, 1, " Choose Repository: ")
+        while True:
+            labels = RepoDashboard(dirs) if dirs else dirs
+            optionInt = GetResponse(labels, 1, " Choose Repository: ")
+            if optionInt in (900, 901):
+                SyncAll(dirs, optionInt == 901)
+            elif optionInt == 907:
+                RemoteGoneSweep(dirs)
+            elif optionInt == 920:
+                GroupMenu()
+            elif optionInt == 930:
+                MaintenanceMenu(dirs)
+            else:
+                break
         if optionInt == 200:
             if gShortcutRepo and gShortcutRepo in dirs:
                 repo = gShortcutRepo
@@ -943,23 +3215,444 @@ def SelectRepo(useDefault=True):
     repoPath = os.path.join(gLocalReposDir, repo)
     os.chdir(repoPath)
 
-    gDatabase = GetKey(gDatabases, repo)
-    if repo in gSpecificMainDev:
-        gMainBranch = gSpecificMainDev[repo]
-    else:
-        gMainBranch = gMainDevBranch
+    settings = GetRepoSettings(repo)
+    gDatabase = settings["database"]
+    gMainBranch = settings["mainBranch"]
+    gSelectedDevHead = settings["devHead"]
+    gSelectedMigration = settings["migration"]
+
+    return repo, optionOne, optionTwo
+
+
+def Navigate():
+    # Menus return the next screen rather than calling Main() again, so a long
+    # session never grows the stack:
+    #   "menu"    - redraw Main from the cached repository state
+    #   "refresh" - probe the repository again, then redraw Main
+    #   "repos"   - back to the Repository select
+    #   None      - exit
+    global gRepoStatus
+    screen = "repos"
+    useDefault = True
+    while screen:
+        if screen == "repos":
+            selection = SelectRepo(useDefault)
+            useDefault = False
+            if not selection:
+                break
+            repo, optionOne, optionTwo = selection
+            gRepoStatus = None
+        else:
+            optionOne = None
+            optionTwo = None
+            if screen == "refresh":
+                gRepoStatus = None
+        screen = Main(repo, optionOne, optionTwo)
 
-    if repo in gSpecificDevHead:
-        gSelectedDevHead = gSpecificDevHead[repo]
-    else:
-        gSelectedDevHead = gDevHeadBranch
 
-    if repo in gSpecificMigration:
-        gSelectedMigration = gSpecificMigration[repo]
-    else:
-        gSelectedMigration = gMigrationFolder
+def CurrentBranch(cwd=None):
+    try:
+        exitcode, out, err = RunCommand(
+            ["git", "symbolic-ref", "--short", "-q", "HEAD"], cwd=cwd
+        )
+    except RunCommandException:
+        return ""  # detached HEAD
+    return out.strip()
+
+
+def UpdateBranch(branch, cwd=None):
+    # Fast-forwards a local branch from origin, without prompts. Only a
+    # checked out branch is pulled; any other branch goes through
+    # FastForwardBranch.
+    if CurrentBranch(cwd) == branch:
+        return RunCommand(["git", "pull", "--ff-only", "origin", branch], cwd=cwd)
+    return FastForwardBranch(branch, cwd)
+
+
+def PlanContext(repo, branch=None, forceFetch=False):
+    repoPath = os.path.join(gLocalReposDir, repo)
+    context = GetRepoSettings(repo)
+    context["repo"] = repo
+    context["repoPath"] = repoPath
+    context["taskBranch"] = branch or GetRepoStatus(repoPath).branch
+    context["forceFetch"] = forceFetch
+    return context
+
+
+def CommandOutput(result):
+    exitcode, out, err = result
+    return (out + err).strip()
+
+
+def CheckoutTaskBranch(context):
+    repoStatus = GetRepoStatus(context["repoPath"])
+    if repoStatus.branch != context["taskBranch"]:
+        RunCommand(["git", "checkout", context["taskBranch"]], cwd=context["repoPath"])
+
+
+def StepFetch(context):
+    if FetchOrigin(context.get("forceFetch", False), context["repoPath"]):
+        return "Fetched origin"
+    return "Skipped, origin fetched recently"
+
+
+def StepPullMain(context):
+    return CommandOutput(UpdateBranch(context["mainBranch"], context["repoPath"]))
+
+
+def AbortMerge(cwd):
+    # After a failed merge step: aborts only a merge that actually started
+    # (a dirty tree stops git before that), so the step's own error is the
+    # one reported.
+    if not os.path.exists(os.path.join(GitDir(cwd), "MERGE_HEAD")):
+        return
+    try:
+        RunCommand(["git", "merge", "--abort"], cwd=cwd)
+    except RunCommandException:
+        pass
+
+
+def StepMergeMain(context):
+    repoPath = context["repoPath"]
+    if context["taskBranch"] in (context["mainBranch"], context["devHead"]):
+        raise Exception(f"Task branch is {context['taskBranch']}")
+    CheckoutTaskBranch(context)
+    try:
+        return CommandOutput(
+            RunCommand(
+                ["git", "merge", "--no-edit", context["mainBranch"]], cwd=repoPath
+            )
+        )
+    except RunCommandException:
+        AbortMerge(repoPath)
+        raise
+
+
+def StepPush(context):
+    repoPath = context["repoPath"]
+    CheckoutTaskBranch(context)
+    repoStatus = GetRepoStatus(repoPath)
+    if repoStatus.upstream == f"origin/{context['taskBranch']}":
+        return CommandOutput(RunCommand(["git", "push"], cwd=repoPath))
+    return CommandOutput(
+        RunCommand(
+            ["git", "push", "--set-upstream", "origin", context["taskBranch"]],
+            cwd=repoPath,
+        )
+    )
+
+
+def StepMergeDevhead(context):
+    repoPath = context["repoPath"]
+    devHead = context["devHead"]
+    if context["taskBranch"] == devHead:
+        raise Exception(f"Task branch is {devHead}")
+    output = []
+    if gDevheadWorktree:
+        worktree = DevheadWorktree(repoPath, devHead)
+        try:
+            results = WorktreeMerge(
+                repoPath, worktree, devHead, context["taskBranch"], pull=True
+            )
+        except RunCommandException:
+            AbortMerge(worktree)
+            raise
+        output += [CommandOutput(result) for result in results]
+        output.append(
+            CommandOutput(
+                RunCommand(
+                    ["git", "push", "origin", f"HEAD:refs/heads/{devHead}"],
+                    cwd=worktree,
+                )
+            )
+        )
+        return "\n".join(output)
+    RunCommand(["git", "checkout", devHead], cwd=repoPath)
+    try:
+        output.append(CommandOutput(UpdateBranch(devHead, repoPath)))
+        try:
+            output.append(
+                CommandOutput(
+                    RunCommand(
+                        ["git", "merge", "--no-edit", context["taskBranch"]],
+                        cwd=repoPath,
+                    )
+                )
+            )
+        except RunCommandException:
+            AbortMerge(repoPath)
+            raise
+        output.append(CommandOutput(RunCommand(["git", "push"], cwd=repoPath)))
+    finally:
+        RunCommand(["git", "checkout", context["taskBranch"]], cwd=repoPath)
+    return "\n".join(output)
+
+
+def StepCompile(context):
+    repoPath = context["repoPath"]
+    db = context["database"]
+    if db not in gDatabases:
+        raise Exception(db)
+    repoStatus = GetRepoStatus(repoPath)
+    databaseItems = BranchChangeSet(
+        repoStatus, context["mainBranch"], repoPath, context["devHead"]
+    )
+    databaseItems = {schema: files[:] for schema, files in databaseItems.items()}
+    DatabaseItems(
+        [d for dbFiles in repoStatus.databaseItems.values() for d in dbFiles],
+        databaseItems,
+    )
+    blobs = HashFiles(
+        [d for dbFiles in databaseItems.values() for d in dbFiles], repoPath
+    )
+    output = []
+    failed = False
+    for schema, dbFiles in databaseItems.items():
+        dbFiles = [d for d in dbFiles if not IsCompiled(db, schema, d, blobs.get(d))]
+        if not dbFiles:
+            continue
+        result = CompileSchema(schema, dbFiles, db, repoPath)
+        RecordCompiled(db, schema, result["fileResults"], blobs)
+        output.append(f"{schema}: {' '.join(dbFiles)}\n{result['out']}{result['err']}")
+        failed = failed or result["exitcode"] != 0 or SqlErrors(result["out"])
+    if failed:
+        raise RunCommandException(1, "\n".join(output), "compile errors")
+    return "\n".join(output) or "Nothing to compile"
+
+
+gPlanSteps = {
+    "fetch": StepFetch,
+    "pullMain": StepPullMain,
+    "mergeMain": StepMergeMain,
+    "push": StepPush,
+    "mergeDevhead": StepMergeDevhead,
+    "compile": StepCompile,
+}
+
+
+def LoadPlan(planPath):
+    with open(planPath, "r") as planFile:
+        if planPath.endswith((".yml", ".yaml")):
+            if yaml is None:
+                raise Exception("PyYAML is required to read YAML plans.")
+            return yaml.safe_load(planFile)
+        return json.load(planFile)
+
+
+def PlanTasks(plan):
+    # One task per (repo, step). A step needs the previous step of the same
+    # repo unless it lists its own "needs"; "repo:step" refers to another repo.
+    tasks = {}
+    for repoEntry in plan["repos"]:
+        if isinstance(repoEntry, str):
+            repoEntry = {"repo": repoEntry}
+        repo = repoEntry["repo"]
+        previous = None
+        for stepEntry in repoEntry.get("steps", plan.get("steps", [])):
+            if isinstance(stepEntry, str):
+                stepEntry = {"step": stepEntry}
+            step = stepEntry["step"]
+            if step not in gPlanSteps:
+                raise Exception(f"Unknown plan step: {step}")
+            if "needs" in stepEntry:
+                needs = [n if ":" in n else f"{repo}:{n}" for n in stepEntry["needs"]]
+            else:
+                needs = [previous] if previous else []
+            taskId = f"{repo}:{step}"
+            tasks[taskId] = {
+                "id": taskId,
+                "repo": repo,
+                "branch": repoEntry.get("branch", plan.get("branch")),
+                "step": step,
+                "needs": needs,
+                "status": "pending",
+                "seconds": None,
+                "output": "",
+                "error": "",
+            }
+            previous = taskId
+    for task in tasks.values():
+        for need in task["needs"]:
+            if need not in tasks:
+                raise Exception(f"{task['id']} needs unknown step {need}")
+    return tasks
+
+
+def RunPlanTask(task, context):
+    start = time.perf_counter()
+    try:
+        task["output"] = gPlanSteps[task["step"]](context)
+        task["status"] = "ok"
+    except RunCommandException as e:
+        task["status"] = "failed"
+        task["output"] = (e.out or "").strip()
+        task["error"] = (e.err or "").strip() or f"exit code {e.exitcode}"
+    except Exception as e:
+        task["status"] = "failed"
+        task["error"] = str(e).strip()
+    task["seconds"] = round(time.perf_counter() - start, 3)
+    return task
+
+
+def RunPlan(plan, workers=None):
+    # Runs ready tasks in a thread pool, at most one task per repo at a time.
+    tasks = PlanTasks(plan)
+    workers = workers or plan.get("workers", gMaxWorkers)
+    contexts = {}
+    pending = list(tasks)
+    running = {}
+    busyRepos = set()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while pending or running:
+            for taskId in pending[:]:
+                task = tasks[taskId]
+                needs = [tasks[n]["status"] for n in task["needs"]]
+                if any(status in ("failed", "skipped") for status in needs):
+                    task["status"] = "skipped"
+                    task["error"] = "needs " + ", ".join(task["needs"])
+                    pending.remove(taskId)
+                elif task["repo"] not in busyRepos and all(
+                    status == "ok" for status in needs
+                ):
+                    repo = task["repo"]
+                    if repo not in contexts:
+                        try:
+                            contexts[repo] = PlanContext(
+                                repo, task["branch"], plan.get("forceFetch", False)
+                            )
+                        except (RunCommandException, OSError) as e:
+                            task["status"] = "failed"
+                            task["error"] = str(getattr(e, "err", e)).strip()
+                            pending.remove(taskId)
+                            continue
+                    busyRepos.add(repo)
+                    pending.remove(taskId)
+                    running[executor.submit(RunPlanTask, task, contexts[repo])] = task
+            if not running:
+                for taskId in pending:
+                    tasks[taskId]["status"] = "skipped"
+                    tasks[taskId]["error"] = "dependency cycle"
+                break
+            done, notDone = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                task = running.pop(future)
+                busyRepos.discard(task["repo"])
+                PrintIndented(
+                    f"{task['id']}: {task['status']} ({task['seconds']:.1f}s)"
+                )
+    return tasks
+
+
+def PlanReport(tasks):
+    report = {"ok": all(t["status"] == "ok" for t in tasks.values()), "repos": {}}
+    for task in tasks.values():
+        repoReport = report["repos"].setdefault(task["repo"], {"steps": []})
+        repoReport["steps"].append(
+            {
+                "step": task["step"],
+                "needs": task["needs"],
+                "status": task["status"],
+                "seconds": task["seconds"],
+                "output": task["output"],
+                "error": task["error"],
+            }
+        )
+    return report
+
 
-    Main(repo, optionOne, optionTwo)
+def PrintPlanReport(tasks):
+    Print_()
+    PrintTable(
+        ["Repository", "Step", "Result", "Time", "Error"],
+        [
+            [
+                t["repo"],
+                t["step"],
+                t["status"],
+                "-" if t["seconds"] is None else f"{t['seconds']:.1f}s",
+                (t["error"].splitlines() or [""])[-1][:60],
+            ]
+            for t in tasks.values()
+        ],
+    )
+    Print_()
+
+
+def FinishPlan(tasks, started, reportPath=None, **fields):
+    PrintPlanReport(tasks)
+    report = PlanReport(tasks)
+    report.update(fields)
+    report["started"] = started
+    report["finished"] = datetime.now().isoformat(timespec="seconds")
+    if reportPath:
+        with open(reportPath, "w") as reportFile:
+            json.dump(report, reportFile, indent=2)
+        Print_(f"Report: {reportPath}")
+    return 0 if report["ok"] else 1
+
+
+def RunPlanFile(planPath, reportPath=None):
+    plan = LoadPlan(planPath)
+    started = datetime.now().isoformat(timespec="seconds")
+    Print_(f"Plan: {planPath}")
+    tasks = RunPlan(plan)
+    return FinishPlan(tasks, started, reportPath, plan=planPath)
+
+
+def DatabaseGroup(db):
+    # The repos paired under one database in the databases config.
+    dirs = ListRepos()
+    return [repo for repo in gDatabases.get(db, []) if repo in dirs]
+
+
+def RunGroup(db, steps, branch=None, reportPath=None):
+    # The same steps on every repo of a database group, as one plan.
+    repos = DatabaseGroup(db)
+    if not repos:
+        Print_(f"No repositories found for database {db}.")
+        return 1
+    started = datetime.now().isoformat(timespec="seconds")
+    Print_(f"Group: {db} ({', '.join(repos)})")
+    tasks = RunPlan({"repos": repos, "steps": steps, "branch": branch or None})
+    return FinishPlan(tasks, started, reportPath, database=db)
+
+
+def GroupMenu():
+    databases = list(gDatabases)
+    if not databases:
+        PrintIndented("**   No databases in the config")
+        return
+    optionInt = GetResponse(
+        [f"{db} ({', '.join(DatabaseGroup(db))})" for db in databases] + ["Exit"],
+        1,
+        " Choose Database: ",
+    )
+    if optionInt >= len(databases):
+        return
+    db = databases[optionInt]
+    workflows = [
+        ["fetch", "pullMain", "mergeMain", "push"],
+        ["fetch", "pullMain", "mergeMain", "push", "mergeDevhead"],
+        ["fetch", "pullMain", "mergeMain", "push", "mergeDevhead", "compile"],
+        ["compile"],
+    ]
+    options = [
+        "Pull main, Merge, Push",                              # 0
+        "Pull main, Merge, Push, Merge into devhead",          # 1
+        "Pull main, Merge, Push, Merge into devhead, Compile", # 2
+        "Compile",                                             # 3
+        "Exit",                                                # 4
+    ]
+    optionInt = GetResponse(options, 2)
+    if optionInt >= len(workflows):
+        return
+    branch = input(" Task Branch (Enter for the checked out branch of each repo): ")
+    RunGroup(
+        db,
+        workflows[optionInt],
+        branch.strip(),
+        os.path.join(gToolDir, "git-123.group.json"),
+    )
 
 
 # load global settings from config file
@@ -995,12 +3688,60 @@ gOutputToFile = configData["outputToFile"]
 gBranchPrefixes = configData["branchPrefixes"]
 gStepsPath = os.path.join(os.getcwd(), "Steps")
 gStepsPrefix = configData["stepsPrefix"]
+gMaxWorkers = configData.get("maxWorkers", 8)
+gMenuPageSize = configData.get("menuPageSize", 20)
+gCompileWorkers = configData.get("compileWorkers", 4)
+gSqlPlus = configData.get("sqlplus", "sqlplus")
+gSqlTimeout = configData.get("sqlTimeout", 600)
+gSqlSessions = {}
+gProbesPerRepo = configData.get("probesPerRepo", 4)
+gCompileFailFast = configData.get("compileFailFast", False)
+atexit.register(CloseSqlSessions)
+gToolDir = os.getcwd()
+gCompileCacheFile = os.path.join(gToolDir, "git-123.compile.json")
+gCompileCache = None
+gCompileCacheLock = threading.Lock()
+gRepoIndexFile = os.path.join(gToolDir, "git-123.index.json")
+gFetchLedgerFile = os.path.join(gToolDir, "git-123.fetch.json")
+gFetchLedgerLock = threading.Lock()
+gFetchFreshness = configData.get("fetchFreshnessSeconds", 60)
+gPrefetchEnabled = configData.get("prefetch", True)
+gPrefetchFreshness = configData.get("prefetchFreshnessSeconds", 300)
+gPrefetch = None
+atexit.register(StopPrefetch)
+gMaintenanceLedgerFile = os.path.join(gToolDir, "git-123.maintenance.json")
+gMaintenanceLedgerLock = threading.Lock()
+gMaintenanceDays = configData.get("maintenanceDays", 7)
+gMaintenanceIdleSeconds = configData.get("maintenanceIdleSeconds", 0)
+gMaintenanceWorkers = configData.get("maintenanceWorkers", 2)
+gMaintenanceTasks = [
+    ("commit-graph", ["git", "commit-graph", "write", "--reachable"]),
+    ("pack-refs", ["git", "pack-refs", "--all"]),
+    ("repack", ["git", "repack", "-d", "-l", "-q"]),
+    ("gc", ["git", "gc", "--auto", "--quiet"]),
+]
+gIdleSince = None
 gMessageFile = None
-gOutputFile = None
+gSessionLog = None
+gCommandStats = []
+gCommandStatsLock = threading.Lock()
+gProfiler = None
+gDaemonSocketPath = os.path.join(
+    gToolDir, configData.get("daemonSocket", "git-123.sock")
+)
+gDaemonPollSeconds = configData.get("daemonPollSeconds", 2)
+gDaemonSocket = None
+gDaemonLocal = threading.local()
+gDevheadWorktree = configData.get("devheadWorktree", False)
+gWorktreeDir = configData.get("worktreeDir") or os.path.join(gToolDir, "worktrees")
 gMessages = []
 gMsgLinesStart = 0
 gMsgLinesEnd = 0
 gRepo = ""
+gRepoStatus = None
+gChangeSetCache = {}
+gFastStatusRepos = {}
+gFsmonitorSupported = None
 
 gitCmd = GitCommands(
     ["git", "add", "--all"],
@@ -1014,41 +3755,110 @@ gitCmd = GitCommands(
     ["git", "push"],
 )
 
-if gOutputToFile:
-    gOutputFile = open("git-123.log", "a")
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="git-123")
+    parser.add_argument("--plan", help="run a JSON/YAML plan file without prompts")
+    parser.add_argument("--report", help="write the plan report (JSON) to this file")
+    parser.add_argument(
+        "--group", help="run --steps on every repo of this database group"
+    )
+    parser.add_argument(
+        "--steps",
+        default="fetch,pullMain,mergeMain,push,mergeDevhead,compile",
+        help="comma separated plan steps for --group",
+    )
+    parser.add_argument("--branch", help="task branch for --group")
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const="git-123.prof",
+        default="git-123.prof" if configData.get("profileSession") else None,
+        help="profile the session with cProfile and dump the stats to this file",
+    )
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="keep repository state warm and serve it to the menus",
+    )
+    parser.add_argument(
+        "--daemon-stop", action="store_true", help="stop a running daemon"
+    )
+    args = parser.parse_args()
 
-fileName = "git-123.txt"
-path = os.path.join(os.getcwd(), fileName)
+    if args.daemon:
+        sys.exit(RunDaemon())
+    if args.daemon_stop:
+        if ConnectDaemon() and DaemonRequest("stop") is not None:
+            Print_("Daemon stopped.")
+        else:
+            Print_("No daemon is running.")
+        sys.exit(0)
+    ConnectDaemon()
 
-if gMessageHistory and os.path.exists(fileName):
-    with open(path, "r") as m:
-        gMessages = m.readlines()
-        gMsgLinesStart = len(gMessages)
+    if args.profile:
+        gProfiler = cProfile.Profile()
+        gProfiler.enable()
+        atexit.register(DumpProfile, os.path.join(gToolDir, args.profile))
 
-Print_("\n" * 3 + "_" * 24)
-Print_(datetime.now().strftime("%a, %b %d: %I:%M:%S %p"))
-Print_("\nBegin.\n" + "_" * 24 + "\n" * 3)
-SelectRepo()
+    if gOutputToFile:
+        gSessionLog = SessionLog(
+            os.path.join(gToolDir, "git-123.log"),
+            os.path.join(gToolDir, "git-123.jsonl"),
+            configData.get("logMaxBytes", 5000000),
+            configData.get("logMaxAgeDays", 30),
+            configData.get("logBackups", 5),
+            configData.get("logCompress", True),
+        )
+        atexit.register(gSessionLog.close)
 
-Print_(datetime.now().strftime("%a, %b %d: %I:%M:%S %p"))
-Print_("\nDone.\n")
+    if args.plan or args.group:
+        if args.plan:
+            exitcode = RunPlanFile(args.plan, args.report)
+        else:
+            exitcode = RunGroup(
+                args.group, args.steps.split(","), args.branch, args.report
+            )
+        if gOutputToFile:
+            gSessionLog.close()
+        sys.exit(exitcode)
+
+    if gMaintenanceIdleSeconds:
+        threading.Thread(target=IdleMaintenance, daemon=True).start()
+
+    fileName = "git-123.txt"
+    path = os.path.join(os.getcwd(), fileName)
+
+    if gMessageHistory and os.path.exists(fileName):
+        with open(path, "r") as m:
+            gMessages = m.readlines()
+            gMsgLinesStart = len(gMessages)
+
+    Print_("\n" * 3 + "_" * 24)
+    Print_(datetime.now().strftime("%a, %b %d: %I:%M:%S %p"))
+    Print_("\nBegin.\n" + "_" * 24 + "\n" * 3)
+    Navigate()
+
+    # before the report and the log are closed: the prefetch thread logs
+    # its fetch as it ends
+    StopPrefetch()
+    PrintTimingReport()
+    Print_(datetime.now().strftime("%a, %b %d: %I:%M:%S %p"))
+    Print_("\nDone.\n")
+
+    if gMessageHistory:
+        gMsgLinesEnd = len(gMessages)
+        if gMsgLinesEnd > gMsgLinesStart:
+            gMessageFile = open(path, "w")
+            for number, line in enumerate(gMessages):
+                if gMsgLinesEnd < 9 or number > gMsgLinesEnd - 10:
+                    gMessageFile.write(line)
+            gMessageFile.close()
 
-if gMessageHistory:
-    gMsgLinesEnd = len(gMessages)
-    if gMsgLinesEnd > gMsgLinesStart:
-        gMessageFile = open(path, "w")
-        for number, line in enumerate(gMessages):
-            if gMsgLinesEnd < 9 or number > gMsgLinesEnd - 10:
-                gMessageFile.write(line)
-        gMessageFile.close()
+    try:
+        if gRepo:
+            HeaderFooter(gRepo, GetRepoStatus())
+    except:
+        pass
 
-try:
-    exitcode, out, err = RunCommand(["git", "symbolic-ref", "--short", "HEAD"])
-    taskBranch = out.strip()
-    if gRepo:
-        HeaderFooter(gRepo, taskBranch)
-except:
-    pass
-
-if gOutputToFile:
-    gOutputFile.close()
+    if gOutputToFile:
+        gSessionLog.close()